@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📈 Auction Analytics - AuctionBot
+تحليلات المزادات على مستوى السيرفر باستخدام NumPy
+
+المطور: دارك
+"""
+
+import asyncio
+import csv
+from datetime import datetime
+from io import StringIO
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+import db
+
+# ==================== ⚙️ SETTINGS ====================
+
+SNIPE_WINDOW = 60      # ثواني قبل النهاية تُعتبر "قنص"
+CURVE_BINS = 10        # عدد نقاط منحنى السعر
+
+AUCTION_COLUMNS = ('id', 'started_at', 'ended_at', 'start_price', 'final_price', 'winner_id')
+BID_COLUMNS = ('auction_id', 'user_id', 'amount', 'created_at')
+
+_COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+_COPY_HEADER_SIZE = 19
+
+# ==================== 📦 BINARY COPY DECODING ====================
+
+def _row_dtype(count: int) -> np.dtype:
+    fields = [('count', '>i2')]
+    for i in range(count):
+        fields += [(f'len{i}', '>i4'), (f'col{i}', '>i8')]
+    return np.dtype(fields)
+
+def decode_copy(data: bytes, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    """تحويل مخرجات COPY الثنائية إلى أعمدة NumPy (أعمدة bigint فقط وبدون NULL)"""
+    if not data:
+        return {name: np.empty(0, dtype=np.int64) for name in columns}
+    if data[:11] != _COPY_SIGNATURE:
+        raise ValueError("Invalid binary COPY header")
+
+    ext_len = int.from_bytes(data[15:19], 'big')
+    body = memoryview(data)[_COPY_HEADER_SIZE + ext_len:len(data) - 2]
+    dtype = _row_dtype(len(columns))
+    if len(body) % dtype.itemsize:
+        raise ValueError("Unexpected row layout in binary COPY data")
+
+    rows = np.frombuffer(body, dtype=dtype)
+    return {name: rows[f'col{i}'].astype(np.int64) for i, name in enumerate(columns)}
+
+# ==================== 🧮 METRICS ====================
+
+def compute(auctions: Dict[str, np.ndarray], bids: Dict[str, np.ndarray]) -> Dict:
+    """حساب المؤشرات لكل المزادات دفعة واحدة"""
+    a_ids = auctions['id']
+    n = len(a_ids)
+    result = {
+        'auctions': n,
+        'bids': len(bids['auction_id']),
+        'curve': [0.0] * CURVE_BINS,
+        'avg_velocity': 0.0,
+        'median_velocity': 0.0,
+        'sniping_ratio': 0.0,
+        'late_bid_share': 0.0,
+        'avg_final_ratio': 0.0,
+        'users': {name: np.empty(0) for name in (
+            'user_id', 'bids', 'auctions', 'wins', 'avg_increment', 'late_share'
+        )},
+        'per_auction': {'id': a_ids, 'bids': np.zeros(n, dtype=np.int64), 'velocity': np.zeros(n)},
+    }
+    if n == 0:
+        return result
+
+    # مزايدات بدون مزاد مطابق في النتيجة تُستبعد بدل أن تُنسب لمزاد خاطئ
+    pos = np.searchsorted(a_ids, bids['auction_id'])
+    known = (pos < n) & (a_ids[np.minimum(pos, n - 1)] == bids['auction_id'])
+    if not known.all():
+        bids = {name: column[known] for name, column in bids.items()}
+        result['bids'] = int(known.sum())
+
+    start_us = auctions['started_at']
+    end_us = auctions['ended_at']
+    start_price = np.maximum(auctions['start_price'], 1)
+    duration_s = np.maximum((end_us - start_us) / 1e6, 1.0)
+
+    # مؤشرات لكل مزاد
+    idx = np.searchsorted(a_ids, bids['auction_id'])
+    counts = np.bincount(idx, minlength=n)
+    velocity = counts / (duration_s / 60)
+    with_bids = counts > 0
+
+    result['per_auction']['bids'] = counts
+    result['per_auction']['velocity'] = velocity
+    result['avg_velocity'] = float(velocity.mean())
+    result['median_velocity'] = float(np.median(velocity))
+    result['avg_final_ratio'] = float((auctions['final_price'][with_bids] / start_price[with_bids]).mean()) if with_bids.any() else 0.0
+
+    if len(idx) == 0:
+        return result
+
+    t = bids['created_at']
+    amount = bids['amount']
+
+    # منحنى السعر: متوسط (السعر / سعر البداية) حسب نسبة الوقت المنقضي
+    frac = np.clip((t - start_us[idx]) / (duration_s[idx] * 1e6), 0.0, 1.0 - 1e-9)
+    bins = (frac * CURVE_BINS).astype(np.int64)
+    ratio = amount / start_price[idx]
+    bin_counts = np.bincount(bins, minlength=CURVE_BINS)
+    curve = np.bincount(bins, weights=ratio, minlength=CURVE_BINS) / np.maximum(bin_counts, 1)
+    result['curve'] = [round(float(v), 3) for v in curve]
+
+    # القنص: آخر مزايدة جاءت خلال آخر SNIPE_WINDOW ثانية
+    late = (end_us[idx] - t) / 1e6 <= SNIPE_WINDOW
+    first = np.r_[True, idx[1:] != idx[:-1]]
+    last = np.r_[idx[1:] != idx[:-1], True]
+    result['sniping_ratio'] = float((last & late).sum() / with_bids.sum())
+    result['late_bid_share'] = float(late.mean())
+
+    # الزيادة عن السعر السابق (أو سعر البداية لأول مزايدة)
+    prev = np.empty_like(amount)
+    prev[1:] = amount[:-1]
+    prev[first] = auctions['start_price'][idx[first]]
+    increment = amount - prev
+
+    # أنماط المستخدمين
+    users, uinv = np.unique(bids['user_id'], return_inverse=True)
+    u_bids = np.bincount(uinv)
+    pairs = np.unique(uinv * n + idx)
+    u_auctions = np.bincount(pairs // n, minlength=len(users))
+
+    winners, win_counts = np.unique(auctions['winner_id'][auctions['winner_id'] != 0], return_counts=True)
+    u_wins = np.zeros(len(users), dtype=np.int64)
+    pos = np.searchsorted(users, winners)
+    found = (pos < len(users)) & (users[np.minimum(pos, len(users) - 1)] == winners)
+    u_wins[pos[found]] = win_counts[found]
+
+    result['users'] = {
+        'user_id': users,
+        'bids': u_bids,
+        'auctions': u_auctions,
+        'wins': u_wins,
+        'avg_increment': np.bincount(uinv, weights=increment) / u_bids,
+        'late_share': np.bincount(uinv, weights=late) / u_bids,
+    }
+    return result
+
+# ==================== 🚀 PUBLIC API ====================
+
+async def analyze_guild(
+    guild_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> Dict:
+    """تحميل بيانات السيرفر دفعة واحدة وحساب التحليلات خارج الـ event loop"""
+    auctions_raw, bids_raw = await db.copy_guild_history_binary(guild_id, since, until)
+
+    def work():
+        return compute(
+            decode_copy(auctions_raw, AUCTION_COLUMNS),
+            decode_copy(bids_raw, BID_COLUMNS)
+        )
+
+    return await asyncio.to_thread(work)
+
+def users_to_csv(result: Dict) -> StringIO:
+    """تصدير أنماط المستخدمين كملف CSV"""
+    users = result['users']
+    order = np.argsort(-users['bids'], kind='stable')
+
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        'User ID', 'Total Bids', 'Auctions', 'Wins',
+        'Avg Increment', f'Late Bids (<{SNIPE_WINDOW}s) %'
+    ])
+    for i in order:
+        writer.writerow([
+            int(users['user_id'][i]),
+            int(users['bids'][i]),
+            int(users['auctions'][i]),
+            int(users['wins'][i]),
+            round(float(users['avg_increment'][i]), 2),
+            round(float(users['late_share'][i]) * 100, 1)
+        ])
+    output.seek(0)
+    return output
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+💾 Backup & Restore - AuctionBot
+نسخ احتياطي واستعادة المزادات والمزايدات بصيغة COPY binary (مع ضغط gzip اختياري)
+
+الاستخدام:
+    python backup.py dump auctions.bak.gz [--guild ID]
+    python backup.py restore auctions.bak.gz [--guild ID]
+
+المطور: دارك
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, Optional
+
+logger = logging.getLogger('AuctionBot')
+
+# ==================== ⚙️ FORMAT ====================
+
+MAGIC = b"AUCTIONBAK"
+VERSION = 1
+FRAME_SIZE = 1 << 20      # تجميع بيانات COPY في إطارات 1MB قبل الكتابة
+COPY_TIMEOUT = 3600.0     # الـ command_timeout الافتراضي (60s) لا يكفي لملايين الصفوف
+COMPRESS_LEVEL = 3        # توازن بين السرعة والحجم
+
+# الترتيب مهم: المزادات قبل المزايدات
+TABLES = {
+    'auctions': (
+        'id', 'guild_id', 'channel_id', 'message_id', 'start_price', 'current_price',
+        'min_increase', 'created_by', 'started_at', 'ended_at', 'winner_id', 'ended', 'cancelled'
+    ),
+    'bids': ('id', 'auction_id', 'user_id', 'amount', 'created_at'),
+    'guild_settings': (
+        'guild_id', 'log_channel_id', 'bidder_role_id', 'currency_name',
+        'commission', 'max_active_auctions', 'updated_at'
+    ),
+}
+
+# استعلامات النسخ عند تحديد سيرفر واحد
+GUILD_QUERIES = {
+    'auctions': "SELECT {cols} FROM auctions WHERE guild_id = $1",
+    'bids': "SELECT {cols} FROM bids WHERE auction_id IN (SELECT id FROM auctions WHERE guild_id = $1)",
+    'guild_settings': "SELECT {cols} FROM guild_settings WHERE guild_id = $1",
+}
+
+
+def _open(path: str, mode: str) -> BinaryIO:
+    """الملفات المنتهية بـ .gz تُضغط تلقائياً"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, compresslevel=COMPRESS_LEVEL)
+    return open(path, mode)
+
+
+def _write_block(f: BinaryIO, data: bytes):
+    f.write(struct.pack('>I', len(data)))
+    f.write(data)
+
+
+def _read_block(f: BinaryIO) -> bytes:
+    header = f.read(4)
+    if len(header) != 4:
+        raise ValueError("Backup file is truncated")
+    size, = struct.unpack('>I', header)
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Backup file is truncated")
+    return data
+
+
+def _count(status: str) -> int:
+    """عدد الصفوف من نص الحالة (مثل: COPY 1200 أو INSERT 0 1200)"""
+    try:
+        return int(status.split()[-1])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+# ==================== 📤 DUMP ====================
+
+async def dump(conn, path: str, guild_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    نسخ الجداول إلى ملف بذاكرة ثابتة: بيانات COPY تُكتب إطاراً بإطار.
+    كل الجداول تُقرأ من نفس الـ snapshot حتى تبقى المزايدات متوافقة مع المزادات.
+    """
+    f = await asyncio.to_thread(_open, path, 'wb')
+    counts = {}
+    try:
+        meta = {
+            'version': VERSION,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'guild_id': guild_id,
+            'tables': {name: list(cols) for name, cols in TABLES.items()},
+        }
+        await asyncio.to_thread(f.write, MAGIC + bytes([VERSION]))
+        await asyncio.to_thread(_write_block, f, json.dumps(meta).encode('utf-8'))
+
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            for name, cols in TABLES.items():
+                buffer = bytearray()
+
+                async def sink(chunk: bytes):
+                    buffer.extend(chunk)
+                    if len(buffer) >= FRAME_SIZE:
+                        frame = bytes(buffer)
+                        buffer.clear()
+                        await asyncio.to_thread(_write_block, f, frame)
+
+                await asyncio.to_thread(_write_block, f, name.encode('utf-8'))
+                if guild_id is None:
+                    status = await conn.copy_from_table(
+                        name, columns=list(cols), output=sink, format='binary', timeout=COPY_TIMEOUT
+                    )
+                else:
+                    status = await conn.copy_from_query(
+                        GUILD_QUERIES[name].format(cols=", ".join(cols)), guild_id,
+                        output=sink, format='binary', timeout=COPY_TIMEOUT
+                    )
+                if buffer:
+                    await asyncio.to_thread(_write_block, f, bytes(buffer))
+                # إطار فارغ = نهاية الجدول
+                await asyncio.to_thread(_write_block, f, b"")
+                counts[name] = _count(status)
+    finally:
+        await asyncio.to_thread(f.close)
+
+    logger.info(f"💾 Backup written to {path}: {counts}")
+    return counts
+
+# ==================== 📥 RESTORE ====================
+
+async def _frames(f: BinaryIO) -> AsyncIterator[bytes]:
+    while True:
+        frame = await asyncio.to_thread(_read_block, f)
+        if not frame:
+            return
+        yield frame
+
+
+async def load(
+    conn,
+    path: str,
+    guild_id: Optional[int] = None,
+    channel_ids: Optional[Iterable[int]] = None
+) -> Dict[str, int]:
+    """
+    دمج نسخة احتياطية في قاعدة البيانات الحالية:
+    - البيانات تُنسخ أولاً لجداول مؤقتة بـ COPY binary
+    - المزادات تأخذ IDs جديدة من الـ sequence وتُربط بها المزايدات
+    - المزادات الموجودة مسبقاً (نفس الرسالة في أي سيرفر) تُتجاهل، فالاستعادة آمنة للتكرار
+    - guild_id يقصر الاستعادة على سيرفر واحد
+    - channel_ids: المزادات غير المنتهية في قنوات خارج القائمة تُستعاد ملغاة ولا تُستأنف
+    """
+    f = await asyncio.to_thread(_open, path, 'rb')
+    try:
+        head = await asyncio.to_thread(f.read, len(MAGIC) + 1)
+        if head[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not an AuctionBot backup file")
+        if head[len(MAGIC)] > VERSION:
+            raise ValueError(f"Unsupported backup version: {head[len(MAGIC)]}")
+        meta = json.loads(await asyncio.to_thread(_read_block, f))
+        for name, cols in meta['tables'].items():
+            if tuple(cols) != TABLES.get(name):
+                raise ValueError(f"Backup columns for '{name}' do not match this version")
+
+        async with conn.transaction():
+            for name in TABLES:
+                await conn.execute(
+                    f"CREATE TEMP TABLE _restore_{name} (LIKE {name}) ON COMMIT DROP;"
+                )
+
+            for _ in meta['tables']:
+                name = (await asyncio.to_thread(_read_block, f)).decode('utf-8')
+                await conn.copy_to_table(
+                    f"_restore_{name}", source=_frames(f), columns=list(TABLES[name]),
+                    format='binary', timeout=COPY_TIMEOUT
+                )
+
+            return await _merge(conn, guild_id, channel_ids)
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def _merge(conn, guild_id: Optional[int], channel_ids: Optional[Iterable[int]]) -> Dict[str, int]:
+    if guild_id is not None:
+        await conn.execute("DELETE FROM _restore_auctions WHERE guild_id <> $1;", guild_id)
+        await conn.execute("DELETE FROM _restore_guild_settings WHERE guild_id <> $1;", guild_id)
+    if channel_ids is not None:
+        # الملف قد يحمل قنوات سيرفر آخر: لا نستأنف مزاداً على رسالة لا يملكها هذا السيرفر
+        await conn.execute(
+            """
+            UPDATE _restore_auctions SET ended = TRUE, cancelled = TRUE
+            WHERE ended = FALSE AND channel_id <> ALL($1::bigint[]);
+            """,
+            list(channel_ids)
+        )
+
+    # message_id فريد في Discord، فأي مزاد موجود على نفس الرسالة (في أي سيرفر) يُتجاهل
+    await conn.execute("""
+        DELETE FROM _restore_auctions r
+        USING auctions a
+        WHERE a.message_id = r.message_id;
+
+        ALTER TABLE _restore_auctions ADD COLUMN new_id INTEGER;
+        UPDATE _restore_auctions SET new_id = nextval(pg_get_serial_sequence('auctions', 'id'));
+        ANALYZE _restore_auctions;
+        ANALYZE _restore_bids;
+    """)
+
+    auction_cols = ", ".join(TABLES['auctions'][1:])
+    auctions = await conn.execute(
+        f"""
+        INSERT INTO auctions (id, {auction_cols})
+        SELECT new_id, {auction_cols} FROM _restore_auctions ORDER BY id;
+        """,
+        timeout=COPY_TIMEOUT
+    )
+    bids = await conn.execute(
+        """
+        INSERT INTO bids (auction_id, user_id, amount, created_at)
+        SELECT r.new_id, b.user_id, b.amount, b.created_at
+        FROM _restore_bids b
+        JOIN _restore_auctions r ON r.id = b.auction_id
+        ORDER BY b.id;
+        """,
+        timeout=COPY_TIMEOUT
+    )
+    settings_cols = ", ".join(TABLES['guild_settings'])
+    settings = await conn.execute(
+        f"""
+        INSERT INTO guild_settings ({settings_cols})
+        SELECT {settings_cols} FROM _restore_guild_settings
+        ON CONFLICT (guild_id) DO NOTHING;
+        """
+    )
+
+    counts = {'auctions': _count(auctions), 'bids': _count(bids), 'guild_settings': _count(settings)}
+    logger.info(f"♻️ Backup restored: {counts}")
+    return counts
+
+# ==================== 🎬 CLI ====================
+
+async def _main(args) -> int:
+    import db
+
+    dsn = args.dsn or os.getenv("DATA", "").strip()
+    if not dsn:
+        print("❌ DATA (Database URL) is missing! استخدم --dsn أو متغير DATA")
+        return 1
+
+    await db.init_pool(dsn)
+    try:
+        if args.action == "dump":
+            counts = await db.backup_to_file(args.path, args.guild)
+        else:
+            await db.create_tables()
+            counts = await db.restore_from_file(args.path, args.guild)
+    finally:
+        await db.close_pool()
+
+    for name, n in counts.items():
+        print(f"  ✅ {name}: {n:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+
+    parser = argparse.ArgumentParser(description="AuctionBot backup / restore")
+    parser.add_argument("action", choices=["dump", "restore"])
+    parser.add_argument("path", help="ملف النسخة (.gz للضغط)")
+    parser.add_argument("--guild", type=int, default=None, help="سيرفر واحد فقط")
+    parser.add_argument("--dsn", default=None, help="رابط قاعدة البيانات (افتراضي: DATA)")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
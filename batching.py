@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📦 Micro-Batching - AuctionBot
+تجميع العمليات المتزامنة (مثل إنهاء عدة مزادات في نفس اللحظة) في دفعة واحدة
+
+المطور: دارك
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger('AuctionBot')
+
+BATCH_WINDOW = 0.5   # ثواني انتظار لتجميع الدفعة
+MAX_BATCH = 50
+
+
+class MicroBatcher:
+    """
+    كل submit ينتظر حتى تُعالج دفعته.
+    الدفعة تُرسل بعد BATCH_WINDOW من أول عنصر أو عند الوصول لـ MAX_BATCH.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], Awaitable[None]],
+        window: float = BATCH_WINDOW,
+        max_batch: int = MAX_BATCH
+    ):
+        self.process = process
+        self.window = window
+        self.max_batch = max_batch
+        self._items: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # مراجع الدفعات الجارية حتى لا يحذفها الـ garbage collector قبل انتهائها
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any):
+        future = asyncio.get_running_loop().create_future()
+        self._items.append((item, future))
+        if len(self._items) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._items = self._items, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            await self.process([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"❌ Batch of {len(batch)} failed: {e}")
+        finally:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
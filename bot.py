@@ -1,313 +1,1403 @@
-# bot.py
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
 """
-الملف الرئيسي لتشغيل البوت.
-تأكد من أن باقي الملفات (database.py, auctions.py, ...) موجودة في نفس المجلد.
-غير .env بقيمك ثم شغل: python bot.py
+🔥 AuctionBot - السماء الجنوبية
+بوت مزادات احترافي مع حماية كاملة ونظام Self-Healing
+
+المطور: دارك
+النسخة: 3.0.0 (Railway Edition)
 """
 
+import os
+import sys
+import atexit
+import queue
+import asyncio
+import logging
+import traceback
+import time
+import csv
+import functools
+import tempfile
+from datetime import datetime, timezone, timedelta
+from io import StringIO, BytesIO
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
 import discord
-from discord.ext import commands
 from discord import app_commands
-import traceback
-import asyncio
+from discord.ext import commands
+from discord.ui import View, Button, Modal, TextInput
+from dotenv import load_dotenv
+
+# استيراد قاعدة البيانات
+import db
+import analytics
+from scheduler import (
+    RestScheduler, retry_after,
+    PRIORITY_BID, PRIORITY_FINAL, PRIORITY_COUNTDOWN
+)
+from router import InteractionRouter
+from registry import AuctionRegistry
+from shutdown import ShutdownCoordinator, ShutdownInProgress
+from profiling import LoopMonitor, Profiler
+from batching import MicroBatcher
+from guilds import GuildSettingsStore
+
+# ==================== 🔧 CONFIGURATION ====================
+
+# تحميل البيئة
+load_dotenv()
+
+# 🛡️ معالجة تلقائية للمسافات والأسطر الجديدة
+def clean_env(var_name: str) -> str:
+    """تنظيف متغيرات البيئة من المسافات والأسطر الجديدة"""
+    value = os.getenv(var_name, "")
+    if value:
+        value = value.strip()
+        value = value.replace('\\n', '').replace('\\r', '')
+        value = value.replace('"', '').replace("'", '')
+    return value
+
+# جلب المتغيرات مع التنظيف التلقائي
+TOKEN = clean_env("DISCORD_TOKEN")
+DATABASE_URL = clean_env("DATA")
+DATABASE_REPLICA_URL = clean_env("DATA_REPLICA")
+LOG_CHANNEL_ID = clean_env("LOG_CHANNEL_ID")
+PROFILING = clean_env("PROFILING").lower() in ("1", "true", "yes")
+ALLOWED_GUILD_ID = clean_env("ALLOWED_GUILD_ID")
+
+# التحقق من المتغيرات الأساسية
+if not TOKEN:
+    print("❌ CRITICAL ERROR: DISCORD_TOKEN is missing!")
+    sys.exit(1)
+
+if not DATABASE_URL:
+    print("❌ CRITICAL ERROR: DATA (Database URL) is missing!")
+    sys.exit(1)
+
+# تحويل ALLOWED_GUILD_ID إلى مجموعة أرقام (يدعم عدة سيرفرات مفصولة بفاصلة)
+if ALLOWED_GUILD_ID:
+    try:
+        ALLOWED_GUILD_ID = {int(g) for g in ALLOWED_GUILD_ID.split(",") if g.strip()}
+    except:
+        ALLOWED_GUILD_ID = None
+
+# تحويل LOG_CHANNEL_ID إلى رقم
+if LOG_CHANNEL_ID:
+    try:
+        LOG_CHANNEL_ID = int(LOG_CHANNEL_ID)
+    except:
+        LOG_CHANNEL_ID = None
 
-from config import BOT_TOKEN, DEFAULT_COMMISSION, DEFAULT_CURRENCY, COOLDOWN_SECONDS
-from database import init_db, set_setting, get_setting, all_settings, create_auction, get_active_auction
-from auctions import AuctionView, build_auction_embed, handle_bid, end_current_auction
-from bids import parse_amount, fmt_amount
-from config import DEFAULT_AUCTION_DURATION_MIN, DEFAULT_MIN_INCREMENT
+# إعادة محاولة حفظ نتائج المزادات المنتهية قبل الرجوع للحفظ صفاً صفاً
+END_RETRIES = 3
+END_RETRY_DELAY = 1.0
+
+# ==================== 📊 LOGGING SETUP ====================
+
+# الكتابة للملف تتم في thread منفصل حتى لا يتوقف الـ event loop
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue,
+    logging.StreamHandler(sys.stdout),
+    logging.FileHandler('bot.log', encoding='utf-8')
+)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    handlers=[QueueHandler(_log_queue)]
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logger = logging.getLogger('AuctionBot')
+
+# ==================== 🎯 BOT SETUP ====================
 
-# Intents
 intents = discord.Intents.default()
-intents.guilds = True
-intents.messages = True
-intents.message_content = False
+intents.message_content = True
 intents.members = True
+intents.guilds = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+scheduler = RestScheduler()
 
-# Use the built-in tree attached to the bot (avoid creating a new CommandTree)
+bot = commands.Bot(
+    command_prefix="!",
+    intents=intents,
+    help_command=None,
+    heartbeat_timeout=60.0,
+    http_trace=scheduler.trace_config()
+)
 tree = bot.tree
+shutdown = ShutdownCoordinator()
+router = InteractionRouter(gate=lambda: shutdown.accepting)
+monitor = LoopMonitor()
+profiler = Profiler()
 
-# --- Helper: get allowed server id (from DB) ---
-async def get_allowed_server_id() -> int | None:
-    v = await get_setting("server_id")
-    return int(v) if v else None
+# ==================== 💾 IN-MEMORY STORAGE ====================
 
-@bot.event
-async def on_ready():
-    print(f"Logged in as {bot.user} ({bot.user.id})")
-    # init DB connection and ensure tables
-    await init_db()
-
-    # If server_id is set in settings, leave other guilds
-    server_id = await get_allowed_server_id()
-    if server_id:
-        for g in list(bot.guilds):
-            if g.id != server_id:
-                try:
-                    await g.leave()
-                    print(f"Left guild {g.id} because not allowed.")
-                except Exception as e:
-                    print("Failed to leave guild:", e)
-
-    # restore active auction panel if any
-    active = await get_active_auction()
-    if active:
-        ch_id = await get_setting("auction_channel_id")
-        currency = await get_setting("currency_name") or DEFAULT_CURRENCY
-        if ch_id:
+AUCTIONS = AuctionRegistry()
+
+# مزادات قيد الإنشاء لكل سيرفر (تُحسب ضمن الحد الأقصى قبل تسجيلها في AUCTIONS)
+PENDING_CREATES = {}
+
+# إعدادات كل سيرفر (LOG_CHANNEL_ID من البيئة قيمة افتراضية فقط)
+guild_settings = GuildSettingsStore(fallback={'log_channel_id': LOG_CHANNEL_ID})
+
+class Auction:
+    def __init__(self, guild_id: int, channel_id: int, message_id: int, db_id: int,
+                 start_price: int, min_increase: int, end_time: float, created_by: int):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.db_id = db_id
+        self.start_price = start_price
+        self.current_price = start_price
+        self.min_increase = min_increase
+        self.end_time = end_time
+        self.created_by = created_by
+        self.highest_bidder = None
+        self.bids = []
+        self.ended = False
+        self.cancelled = False
+        self.closed_in_db = False
+        self.start_time = asyncio.get_event_loop().time()
+
+    def to_log_embed(self, guild_name: str) -> discord.Embed:
+        if self.cancelled:
+            embed = discord.Embed(title="🚫 تقرير المزاد - تم الإلغاء", color=0xe74c3c)
+        else:
+            embed = discord.Embed(title="📜 تقرير المزاد الكامل", color=0x2F3136)
+        
+        embed.add_field(name="اسم السيرفر", value=guild_name, inline=False)
+        
+        # start_time / end_time بتوقيت الـ event loop، نحولها لوقت حقيقي
+        offset = time.time() - asyncio.get_event_loop().time()
+        start_dt = datetime.fromtimestamp(self.start_time + offset, tz=timezone.utc)
+        end_dt = datetime.fromtimestamp(self.end_time + offset, tz=timezone.utc)
+        embed.add_field(name="بداية المزاد", value=start_dt.strftime("%Y-%m-%d %H:%M UTC"), inline=True)
+        embed.add_field(name="نهاية المزاد", value=end_dt.strftime("%Y-%m-%d %H:%M UTC"), inline=True)
+        
+        if self.bids:
+            text = ""
+            for i, bid in enumerate(self.bids[-10:], start=1):
+                t_iso, uid, amt = bid
+                text += f"{i}. <@{uid}> — **{fmt_price(amt, self.guild_id)}**\n"
+            embed.add_field(name="📋 سجل المزايدات", value=text or "لا توجد", inline=False)
+        
+        participants = len(set([b[1] for b in self.bids]))
+        embed.add_field(
+            name="📊 إحصائيات",
+            value=f"المزايدات: {len(self.bids)} | المشاركين: {participants}",
+            inline=False
+        )
+        
+        if self.cancelled:
+            embed.add_field(
+                name="🚫 النتيجة",
+                value=f"**تم الإلغاء**\nآخر سعر: **{fmt_price(self.current_price, self.guild_id)}**",
+                inline=False
+            )
+        else:
+            winner = f"<@{self.highest_bidder}>" if self.highest_bidder else "لا يوجد"
+            result = f"الفائز: {winner}\nالمبلغ: **{fmt_price(self.current_price, self.guild_id)}**"
+            commission = guild_settings.peek(self.guild_id)['commission']
+            if commission and self.highest_bidder:
+                fee = self.current_price * commission // 100
+                result += f"\nالعمولة ({commission}%): **{fmt_price(fee, self.guild_id)}**"
+            embed.add_field(name="🏆 النتيجة", value=result, inline=False)
+        
+        embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+        return embed
+
+# ==================== 🔧 HELPER FUNCTIONS ====================
+
+def parse_amount(text: str) -> int:
+    if not text:
+        return 0
+    s = str(text).strip().lower().replace(",", "")
+    try:
+        if s.isdigit():
+            return int(s)
+        if s.endswith("k"):
+            return int(float(s[:-1]) * 1000)
+        if s.endswith("m"):
+            return int(float(s[:-1]) * 1000000)
+        return int(float(s))
+    except:
+        return 0
+
+def fmt_price(n: int, guild_id: int) -> str:
+    """المبلغ مع اسم عملة السيرفر إن وُجد"""
+    currency = guild_settings.peek(guild_id)['currency_name']
+    return f"{fmt_amount(n)} {currency}" if currency else fmt_amount(n)
+
+async def prime_settings(guild_ids):
+    """تحميل إعدادات السيرفرات مسبقاً حتى تعرضها fmt_price (التي تستخدم peek) بشكل صحيح"""
+    results = await asyncio.gather(*(guild_settings.get(g) for g in set(guild_ids)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error loading guild settings: {result}")
+
+def has_bidder_role(member, settings: dict) -> bool:
+    role_id = settings['bidder_role_id']
+    return not role_id or any(r.id == role_id for r in getattr(member, 'roles', []))
+
+def fmt_amount(n: int) -> str:
+    if not n:
+        return "0"
+    if n >= 1_000_000:
+        v = n / 1_000_000
+        return f"{int(v)}m" if v.is_integer() else f"{v:.2f}m"
+    if n >= 1_000:
+        v = n / 1_000
+        return f"{int(v)}k" if v.is_integer() else f"{v:.1f}k"
+    return f"{n:,}"
+
+# ==================== 🎨 UI COMPONENTS ====================
+
+async def save_bid(auction: Auction, user_id: int, amount: int):
+    try:
+        await db.insert_bid(auction.db_id, user_id, amount)
+    except Exception as e:
+        logger.error(f"Error saving bid: {e}")
+
+class BidModal(Modal, title="اكتب المبلغ"):
+    """نموذج المبلغ فقط، والإرسال يعالجه router (bid.submit) مع defer تلقائي"""
+    amount = TextInput(
+        label="المبلغ (مثال: 100k أو 1m)",
+        placeholder="مثال: 500k",
+        required=True,
+        max_length=20,
+        custom_id="amount"
+    )
+
+    def __init__(self, auction_message_id: int):
+        super().__init__(custom_id=router.custom_id("bid.submit", auction_message_id))
+        self.auction_message_id = auction_message_id
+        # إيقافه يمنع discord.py من تخزينه ومعالجة الإرسال مرة ثانية
+        self.stop()
+
+class AuctionView(View):
+    """أزرار المزاد فقط، والضغطات يعالجها router (تعمل حتى بعد إعادة التشغيل)"""
+    def __init__(self, auction_message_id: int):
+        super().__init__(timeout=None)
+        self.auction_message_id = auction_message_id
+        self.add_item(Button(
+            label="زايد +",
+            style=discord.ButtonStyle.primary,
+            custom_id=router.custom_id("bid.quick", auction_message_id)
+        ))
+        self.add_item(Button(
+            label="مبلغ مخصّص",
+            style=discord.ButtonStyle.secondary,
+            custom_id=router.custom_id("bid.custom", auction_message_id)
+        ))
+        # View للعرض فقط: إيقافها يمنع discord.py من تخزينها في ViewStore للأبد
+        self.stop()
+
+@router.route("bid.quick", int)
+async def on_quick_bid(interaction: discord.Interaction, message_id: int):
+    auction = AUCTIONS.get(message_id)
+    
+    if not auction or auction.ended or auction.cancelled:
+        await router.respond(interaction, "❌ المزاد غير متاح", ephemeral=True)
+        return
+    
+    if not has_bidder_role(interaction.user, await guild_settings.get(auction.guild_id)):
+        await router.respond(interaction, "❌ تحتاج رتبة المزايدين", ephemeral=True)
+        return
+    
+    try:
+        async with shutdown.guard():
+            amt = auction.current_price + auction.min_increase
+            auction.current_price = amt
+            auction.highest_bidder = interaction.user.id
+            ts = datetime.now(timezone.utc).isoformat()
+            auction.bids.append((ts, interaction.user.id, amt))
+            await save_bid(auction, interaction.user.id, amt)
+    except ShutdownInProgress:
+        await router.respond(interaction, router.gate_message, ephemeral=True)
+        return
+    
+    update_auction_message(auction)
+    
+    await router.respond(
+        interaction,
+        f"✅ تمت مزايدتك بمبلغ **{fmt_price(amt, auction.guild_id)}**",
+        ephemeral=True
+    )
+
+@router.route("bid.custom", int, defer=False)
+async def on_custom_bid(interaction: discord.Interaction, message_id: int):
+    auction = AUCTIONS.get(message_id)
+    
+    if not auction or auction.ended or auction.cancelled:
+        await interaction.response.send_message("❌ المزاد غير متاح", ephemeral=True)
+        return
+    
+    if not has_bidder_role(interaction.user, await guild_settings.get(auction.guild_id)):
+        await interaction.response.send_message("❌ تحتاج رتبة المزايدين", ephemeral=True)
+        return
+    
+    await interaction.response.send_modal(BidModal(message_id))
+
+@router.route("bid.submit", int)
+async def on_bid_submit(interaction: discord.Interaction, message_id: int):
+    amt = parse_amount(router.field(interaction, "amount"))
+    auction = AUCTIONS.get(message_id)
+    
+    if not auction or auction.ended or auction.cancelled:
+        await router.respond(interaction, "❌ المزاد غير متاح الآن", ephemeral=True)
+        return
+    
+    if interaction.user.bot:
+        await router.respond(interaction, "❌ البوتات غير مسموح لها بالمزايدة", ephemeral=True)
+        return
+    
+    if not has_bidder_role(interaction.user, await guild_settings.get(auction.guild_id)):
+        await router.respond(interaction, "❌ تحتاج رتبة المزايدين", ephemeral=True)
+        return
+    
+    min_needed = auction.current_price + auction.min_increase
+    if amt < min_needed:
+        await router.respond(
+            interaction,
+            f"❌ المبلغ أقل من المطلوب\\nالحد الأدنى: **{fmt_price(min_needed, auction.guild_id)}**",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        async with shutdown.guard():
+            auction.current_price = amt
+            auction.highest_bidder = interaction.user.id
+            ts = datetime.now(timezone.utc).isoformat()
+            auction.bids.append((ts, interaction.user.id, amt))
+            await save_bid(auction, interaction.user.id, amt)
+    except ShutdownInProgress:
+        await router.respond(interaction, router.gate_message, ephemeral=True)
+        return
+    
+    update_auction_message(auction)
+    
+    await router.respond(
+        interaction,
+        f"✅ تمت مزايدتك بمبلغ **{fmt_price(amt, auction.guild_id)}** بنجاح!",
+        ephemeral=True
+    )
+
+# ==================== 🔄 HELPER FUNCTIONS ====================
+
+def build_auction_embed(auction: Auction) -> discord.Embed:
+    embed = discord.Embed(title="🔥 المزاد مشتعل 🔥", color=0x9b59b6)
+    embed.add_field(name="💰 السعر الحالي", value=f"**{fmt_price(auction.current_price, auction.guild_id)}**", inline=True)
+    
+    bidder_text = f"<@{auction.highest_bidder}>" if auction.highest_bidder else "لا يوجد"
+    embed.add_field(name="👑 أعلى مزايد", value=bidder_text, inline=True)
+    
+    seconds_left = max(0, int(auction.end_time - asyncio.get_event_loop().time()))
+    mins = seconds_left // 60
+    secs = seconds_left % 60
+    time_text = f"{mins}د {secs}ث" if mins > 0 else f"{secs}ث"
+    embed.add_field(name="⏳ الوقت المتبقي", value=time_text, inline=False)
+    
+    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+    return embed
+
+def update_auction_message(auction: Auction, priority: int = PRIORITY_BID) -> asyncio.Future:
+    """جدولة تحديث لوحة المزاد (التحديثات المتتالية لنفس اللوحة تُدمج)"""
+    async def edit():
+        if auction.ended:
+            return
+        channel = bot.get_channel(auction.channel_id)
+        if not channel:
+            return
+        msg = channel.get_partial_message(auction.message_id)
+        await msg.edit(embed=build_auction_embed(auction))
+    
+    return scheduler.submit(priority, auction.channel_id, edit, key=("panel", auction.message_id))
+
+def active_auctions() -> list:
+    return [a for a in AUCTIONS.values() if not a.ended and not a.cancelled]
+
+def refresh_countdown(auction: Auction):
+    # قائمة العداد قد تكون قديمة، فالمزادات المنتهية منذ أخذها تُتجاهل
+    if auction.ended or auction.cancelled:
+        return
+    update_auction_message(auction, PRIORITY_COUNTDOWN)
+
+async def handle_auction_end(message_id: int, end_time: float):
+    now = asyncio.get_event_loop().time()
+    wait = end_time - now
+    
+    if wait > 0:
+        await asyncio.sleep(wait)
+    
+    auction = AUCTIONS.get(message_id)
+    if not auction or auction.ended:
+        return
+    
+    # أثناء الإيقاف نترك المزاد مفتوحاً في قاعدة البيانات لتُنهيه العملية الجديدة
+    if shutdown.closing:
+        return
+    
+    async with shutdown.guard():
+        auction.ended = True
+        await close_pipeline.submit(auction)
+    
+    # إذا فشل الحفظ يبقى المزاد (منتهياً) في الذاكرة حتى لا يُستأنف أو يُغلق مرة ثانية هنا،
+    # وقاعدة البيانات ما زالت تراه مفتوحاً فتُنهيه restore_auctions بعد إعادة التشغيل
+    if auction.closed_in_db:
+        AUCTIONS.remove(message_id)
+    else:
+        logger.error(f"⚠️ Auction {auction.db_id} ended but was not saved, keeping it in memory")
+
+async def edit_final_panel(auction: Auction):
+    channel = bot.get_channel(auction.channel_id)
+    if not channel:
+        return
+    
+    embed = discord.Embed(title="🏆 انتهى المزاد 🏆", color=0x95a5a6)
+    
+    winner_text = f"<@{auction.highest_bidder}>" if auction.highest_bidder else "❌ لم يتم البيع"
+    embed.add_field(name="🏆 الفائز", value=winner_text, inline=True)
+    embed.add_field(name="💰 السعر النهائي", value=f"**{fmt_price(auction.current_price, auction.guild_id)}**", inline=True)
+    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+    
+    msg = channel.get_partial_message(auction.message_id)
+    await scheduler.submit(
+        PRIORITY_FINAL, auction.channel_id,
+        lambda: msg.edit(embed=embed, view=None),
+        key=("panel", auction.message_id)
+    )
+
+async def get_log_channel_id(guild_id: int) -> Optional[int]:
+    return (await guild_settings.get(guild_id))['log_channel_id']
+
+async def post_log_reports(auctions: list):
+    """إرسال تقارير المزادات لروم اللوق، عدة تقارير في رسالة واحدة"""
+    by_channel = {}
+    for auction in auctions:
+        channel_id = await get_log_channel_id(auction.guild_id)
+        if channel_id:
+            guild = bot.get_guild(auction.guild_id)
+            embed = auction.to_log_embed(guild.name if guild else str(auction.guild_id))
+            by_channel.setdefault(channel_id, []).append(embed)
+    
+    sends = []
+    for channel_id, embeds in by_channel.items():
+        channel = bot.get_channel(channel_id)
+        if not channel:
+            continue
+        
+        # حدود Discord: 10 embeds و 6000 حرف لكل رسالة
+        chunk, size = [], 0
+        for embed in embeds:
+            if chunk and (len(chunk) == 10 or size + len(embed) > 6000):
+                sends.append(scheduler.submit(PRIORITY_LOG, channel_id, functools.partial(channel.send, embeds=chunk)))
+                chunk, size = [], 0
+            chunk.append(embed)
+            size += len(embed)
+        sends.append(scheduler.submit(PRIORITY_LOG, channel_id, functools.partial(channel.send, embeds=chunk)))
+    
+    for result in await asyncio.gather(*sends, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Error posting log report: {result}")
+
+async def finalize_auctions(auctions: list):
+    """حفظ نتائج الدفعة باستعلام واحد مع إعادة المحاولة، ثم مزاداً مزاداً إذا استمر الفشل"""
+    saved = [a for a in auctions if a.db_id is not None]
+    results = [(a.db_id, a.highest_bidder, a.current_price) for a in saved]
+    for attempt in range(END_RETRIES):
+        try:
+            await db.end_auctions(results)
+            break
+        except Exception as e:
+            logger.error(f"Error ending auctions in DB (attempt {attempt + 1}/{END_RETRIES}): {e}")
+            await asyncio.sleep(END_RETRY_DELAY * (attempt + 1))
+    else:
+        # مزاد واحد سيئ لا يمنع حفظ بقية الدفعة
+        failed = []
+        for auction in saved:
             try:
-                ch = bot.get_channel(int(ch_id))
-                if ch:
-                    embed = build_auction_embed(active, currency_name=currency)
-                    view = AuctionView(active["id"])
-                    await ch.send(embed=embed, view=view)
+                await db.end_auction(auction.db_id, auction.highest_bidder, auction.current_price)
             except Exception as e:
-                print("Failed to restore auction panel:", e)
+                logger.error(f"Error ending auction {auction.db_id} in DB: {e}")
+                failed.append(auction)
+        saved = [a for a in saved if a not in failed]
+    
+    for auction in auctions:
+        auction.closed_in_db = auction.db_id is None or auction in saved
+
+async def close_auctions(auctions: list):
+    """إنهاء دفعة مزادات: قاعدة البيانات واللوحات واللوق بالتوازي"""
+    await prime_settings(a.guild_id for a in auctions)
+    results = await asyncio.gather(
+        finalize_auctions(auctions),
+        post_log_reports(auctions),
+        *(edit_final_panel(a) for a in auctions),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error closing auction: {result}")
+
+close_pipeline = MicroBatcher(close_auctions)
 
-    # sync commands: prefer guild sync if allowed server is set (faster dev feedback)
+async def restore_auctions():
+    """استئناف المزادات غير المنتهية من قاعدة البيانات بعد إعادة التشغيل"""
     try:
-        if server_id:
-            guild_obj = discord.Object(id=server_id)
-            await tree.sync(guild=guild_obj)
-            print(f"Commands synced to guild {server_id}.")
-        else:
-            # global sync (may take time to propagate)
-            await tree.sync()
-            print("Commands synced globally.")
+        rows = await db.get_live_auctions()
     except Exception as e:
-        print("Failed to sync commands:", e)
+        logger.error(f"Error restoring auctions: {e}")
+        return
+    
+    await prime_settings(row['guild_id'] for row in rows)
+    
+    loop_now = asyncio.get_event_loop().time()
+    wall_now = datetime.now(timezone.utc)
+    restored = 0
+    
+    for row in rows:
+        # رسالة مسجلة بالفعل لا تُستبدل (AUCTIONS.add يحذف المزاد السابق على نفس الرسالة)
+        if AUCTIONS.by_db_id(row['id']) or AUCTIONS.get(row['message_id']):
+            continue
+        
+        channel = bot.get_channel(row['channel_id'])
+        if channel is not None and getattr(channel, 'guild', None) and channel.guild.id != row['guild_id']:
+            logger.warning(f"⚠️ Skipping auction #{row['id']}: channel belongs to another guild")
+            continue
+        
+        ends_at = row['ended_at']
+        auction = Auction(
+            guild_id=row['guild_id'],
+            channel_id=row['channel_id'],
+            message_id=row['message_id'],
+            db_id=row['id'],
+            start_price=row['start_price'],
+            min_increase=row['min_increase'],
+            end_time=loop_now + ((ends_at - wall_now).total_seconds() if ends_at else 0),
+            created_by=row['created_by']
+        )
+        auction.current_price = row['current_price']
+        # start_time بتوقيت الـ loop، نحسبه من وقت البداية الحقيقي لا من وقت إعادة التشغيل
+        if row['started_at']:
+            auction.start_time = loop_now - (wall_now - row['started_at']).total_seconds()
+        for bid in row['bids']:
+            ts = bid['created_at'].isoformat() if bid['created_at'] else ""
+            auction.bids.append((ts, bid['user_id'], bid['amount']))
+        if auction.bids:
+            auction.highest_bidder = auction.bids[-1][1]
+        
+        AUCTIONS.add(auction)
+        update_auction_message(auction, PRIORITY_FINAL)
+        asyncio.create_task(handle_auction_end(auction.message_id, auction.end_time))
+        restored += 1
+    
+    if restored:
+        logger.info(f"♻️ Restored {restored} live auction(s)")
 
-# -------------------------
-# CONFIG COMMANDS (English names, Arabic descriptions)
-# -------------------------
+# ==================== 📝 SLASH COMMANDS ====================
 
-@tree.command(name="config_set_server", description="تعيين السيرفر المسموح لتشغيل البوت (Set allowed server).")
-@app_commands.describe(secret="Secret code (for exclusive actions, optional)")
-async def config_set_server(interaction: discord.Interaction, secret: str = ""):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute this command in the server you want to allow.", ephemeral=True)
+@tree.command(name="مزاد", description="إنشاء مزاد جديد (إدارة فقط)")
+@app_commands.describe(
+    start="سعر البداية (مثال: 500k أو 1m)",
+    min_inc="أقل زيادة (مثال: 50k)",
+    duration="مدة المزاد بالدقائق"
+)
+async def cmd_create_auction(
+    interaction: discord.Interaction,
+    start: str,
+    min_inc: str,
+    duration: int
+):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة السيرفر", ephemeral=True)
+        return
+    
+    if shutdown.closing:
+        await interaction.followup.send(router.gate_message, ephemeral=True)
+        return
+    
+    start_price = parse_amount(start)
+    min_increase = parse_amount(min_inc)
+    
+    if start_price <= 0 or min_increase <= 0 or duration <= 0:
+        await interaction.followup.send("❌ المدخلات غير صحيحة", ephemeral=True)
         return
-    # require Manage Server or correct secret (if secret already set)
-    current_secret = await get_setting("secret_code") or ""
-    if not interaction.user.guild_permissions.manage_guild and (secret != current_secret):
-        await interaction.response.send_message("You need Manage Server permission or the correct secret.", ephemeral=True)
+    
+    guild_id = interaction.guild_id
+    settings = await guild_settings.get(guild_id)
+    
+    embed = discord.Embed(title="🔥 المزاد مشتعل 🔥", color=0x9b59b6)
+    embed.add_field(name="💰 السعر الحالي", value=f"**{fmt_price(start_price, guild_id)}**", inline=True)
+    embed.add_field(name="👑 أعلى مزايد", value="لا يوجد", inline=True)
+    embed.add_field(name="⏳ الوقت المتبقي", value=f"{duration}د", inline=False)
+    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+    
+    # الحجز يتم قبل أي await حتى لا تتجاوز الأوامر المتزامنة الحد (None = بدون حد)
+    limit = settings['max_active_auctions']
+    if limit is not None and len(AUCTIONS.active_in_guild(guild_id)) + PENDING_CREATES.get(guild_id, 0) >= limit:
+        await interaction.followup.send(
+            f"❌ وصلت للحد الأقصى من المزادات النشطة ({limit})",
+            ephemeral=True
+        )
         return
-    await set_setting("server_id", str(interaction.guild.id))
-    await set_setting("guild_name", interaction.guild.name)
+    PENDING_CREATES[guild_id] = PENDING_CREATES.get(guild_id, 0) + 1
+    
     try:
-        await tree.sync(guild=interaction.guild)
-    except Exception:
-        pass
-    await interaction.response.send_message(f"تم تعيين السيرفر المسموح: {interaction.guild.name}", ephemeral=True)
-
-@tree.command(name="config_set_role", description="تعيين رتبة 'رواد المزاد' (Role for bidding).")
-@app_commands.describe(role="Role that can participate in auctions")
-async def config_set_role(interaction: discord.Interaction, role: discord.Role):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute this command in the server.", ephemeral=True)
-        return
-    if not interaction.user.guild_permissions.manage_roles:
-        await interaction.response.send_message("You need Manage Roles permission.", ephemeral=True)
-        return
-    await set_setting("role_id", str(role.id))
-    await interaction.response.send_message(f"تم تعيين رتبة الرواد: {role.name}", ephemeral=True)
-
-@tree.command(name="config_set_channels", description="تعيين رومات المزاد و روم اللوق (Auction & Log channels).")
-@app_commands.describe(auction_channel="Channel for auction panel", log_channel="Channel for logs")
-async def config_set_channels(interaction: discord.Interaction, auction_channel: discord.TextChannel, log_channel: discord.TextChannel):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute this command in the server.", ephemeral=True)
-        return
-    if not interaction.user.guild_permissions.manage_channels:
-        await interaction.response.send_message("You need Manage Channels permission.", ephemeral=True)
-        return
-    await set_setting("auction_channel_id", str(auction_channel.id))
-    await set_setting("log_channel_id", str(log_channel.id))
-    await interaction.response.send_message(f"تم تعيين قنوات المزاد واللوق.", ephemeral=True)
-
-@tree.command(name="config_set_secret", description="تعيين أو تغيير الرمز السري (Secret code).")
-@app_commands.describe(secret="Secret code string")
-async def config_set_secret(interaction: discord.Interaction, secret: str):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute this command in the server.", ephemeral=True)
+        async with shutdown.guard():
+            view = AuctionView(-1)
+            msg = await interaction.channel.send(embed=embed, view=view)
+            
+            started_at = datetime.now(timezone.utc)
+            end_time_dt = started_at + timedelta(minutes=duration)
+            
+            try:
+                auction_db_id = await db.insert_auction(
+                    interaction.guild_id,
+                    interaction.channel_id,
+                    msg.id,
+                    start_price,
+                    start_price,
+                    min_increase,
+                    interaction.user.id,
+                    started_at.isoformat(),
+                    end_time_dt.isoformat()
+                )
+            except Exception as e:
+                logger.error(f"Error creating auction in DB: {e}")
+                auction_db_id = None
+            
+            auction = Auction(
+                guild_id=interaction.guild_id,
+                channel_id=interaction.channel_id,
+                message_id=msg.id,
+                db_id=auction_db_id,
+                start_price=start_price,
+                min_increase=min_increase,
+                end_time=asyncio.get_event_loop().time() + duration * 60,
+                created_by=interaction.user.id
+            )
+            
+            AUCTIONS.add(auction)
+    except ShutdownInProgress:
+        await interaction.followup.send(router.gate_message, ephemeral=True)
         return
+    finally:
+        PENDING_CREATES[guild_id] -= 1
+        if not PENDING_CREATES[guild_id]:
+            del PENDING_CREATES[guild_id]
+    
+    await msg.edit(view=AuctionView(msg.id))
+    
+    asyncio.create_task(handle_auction_end(msg.id, auction.end_time))
+    
+    await interaction.followup.send(f"✅ تم إنشاء المزاد بنجاح!", ephemeral=True)
+
+@tree.command(name="إلغاء_مزاد", description="إلغاء مزاد نشط (إدارة فقط)")
+@app_commands.describe(message_id="ID رسالة المزاد أو #رقم المزاد (اختياري إذا كان في القناة مزاد واحد)")
+async def cmd_cancel_auction(interaction: discord.Interaction, message_id: str = ""):
+    await interaction.response.defer(ephemeral=True)
+    
     if not interaction.user.guild_permissions.manage_guild:
-        await interaction.response.send_message("You need Manage Server permission.", ephemeral=True)
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
+        return
+    
+    message_id = message_id.strip()
+    if not message_id:
+        candidates = AUCTIONS.active_in_channel(interaction.channel_id)
+        if not candidates:
+            await interaction.followup.send("❌ لا يوجد مزاد نشط في هذه القناة", ephemeral=True)
+            return
+        if len(candidates) > 1:
+            ids = "\n".join(f"#{a.db_id} — `{a.message_id}`" for a in candidates)
+            await interaction.followup.send(f"❌ يوجد أكثر من مزاد نشط، حدد واحداً:\n{ids}", ephemeral=True)
+            return
+        auction = candidates[0]
+    else:
+        try:
+            if message_id.startswith("#"):
+                auction = AUCTIONS.by_db_id(int(message_id[1:]))
+            else:
+                auction = AUCTIONS.get(int(message_id))
+        except:
+            await interaction.followup.send("❌ ID الرسالة غير صحيح", ephemeral=True)
+            return
+    
+    if not auction or auction.guild_id != interaction.guild_id:
+        await interaction.followup.send("❌ لم أجد هذا المزاد", ephemeral=True)
         return
-    await set_setting("secret_code", secret)
-    await interaction.response.send_message("تم تحديث الرمز السري.", ephemeral=True)
+    
+    await prime_settings([auction.guild_id])
+    
+    if auction.ended or auction.cancelled:
+        await interaction.followup.send("❌ المزاد منتهي أو ملغي بالفعل", ephemeral=True)
+        return
+    
+    async def edit_panel():
+        channel = bot.get_channel(auction.channel_id)
+        try:
+            msg = channel.get_partial_message(auction.message_id)
+            embed = discord.Embed(title="🚫 تم إلغاء المزاد", color=0xe74c3c)
+            embed.add_field(name="السبب", value="تم الإلغاء من قبل الإدارة", inline=False)
+            
+            if auction.highest_bidder:
+                embed.add_field(name="آخر مزايد", value=f"<@{auction.highest_bidder}>", inline=True)
+                embed.add_field(name="آخر سعر", value=f"**{fmt_price(auction.current_price, auction.guild_id)}**", inline=True)
+            
+            embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+            await scheduler.submit(
+                PRIORITY_FINAL, auction.channel_id,
+                lambda: msg.edit(embed=embed, view=None),
+                key=("panel", auction.message_id)
+            )
+        except Exception as e:
+            logger.error(f"Error updating cancelled auction: {e}")
+    
+    async def cancel_in_db():
+        try:
+            await db.cancel_auction(auction.db_id)
+        except Exception as e:
+            logger.error(f"Error cancelling auction in DB: {e}")
+    
+    try:
+        async with shutdown.guard():
+            auction.cancelled = True
+            auction.ended = True
+            await asyncio.gather(edit_panel(), cancel_in_db(), post_log_reports([auction]))
+    except ShutdownInProgress:
+        await interaction.followup.send(router.gate_message, ephemeral=True)
+        return
+    
+    AUCTIONS.remove(auction.message_id)
+    
+    await interaction.followup.send("✅ تم إلغاء المزاد بنجاح", ephemeral=True)
 
-@tree.command(name="config_set_misc", description="تعيين العمولة واسم العملة (Commission & Currency).")
-@app_commands.describe(commission="Commission percent (e.g. 20)", currency="Display currency name (e.g. Credits)")
-async def config_set_misc(interaction: discord.Interaction, commission: int = DEFAULT_COMMISSION, currency: str = DEFAULT_CURRENCY):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute this command in the server.", ephemeral=True)
+@tree.command(name="مزادات_نشطة", description="عرض المزادات النشطة في السيرفر")
+async def cmd_active_auctions(interaction: discord.Interaction):
+    auctions = AUCTIONS.active_in_guild(interaction.guild_id)
+    if not auctions:
+        await interaction.response.send_message("📭 لا توجد مزادات نشطة", ephemeral=True)
         return
-    if not interaction.user.guild_permissions.manage_guild:
-        await interaction.response.send_message("You need Manage Server permission.", ephemeral=True)
+    
+    await prime_settings([interaction.guild_id])
+    
+    embed = discord.Embed(title="🔥 المزادات النشطة", description=f"{len(auctions)} مزاد", color=0x9b59b6)
+    now = asyncio.get_event_loop().time()
+    for auction in auctions[:25]:
+        seconds_left = max(0, int(auction.end_time - now))
+        link = f"https://discord.com/channels/{auction.guild_id}/{auction.channel_id}/{auction.message_id}"
+        embed.add_field(
+            name=f"#{auction.db_id}",
+            value=f"**السعر:** {fmt_price(auction.current_price, auction.guild_id)}\n**المتبقي:** {seconds_left // 60}د {seconds_left % 60}ث\n[الانتقال للمزاد]({link})",
+            inline=True
+        )
+    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tree.command(name="سجل_المزادات", description="عرض المزادات السابقة")
+@app_commands.describe(limit="عدد المزادات (افتراضي: 10)")
+async def cmd_auction_history(interaction: discord.Interaction, limit: int = 10):
+    await interaction.response.defer(ephemeral=True)
+    
+    if limit < 1 or limit > 50:
+        await interaction.followup.send("❌ الحد الأدنى 1 والحد الأقصى 50", ephemeral=True)
         return
-    await set_setting("commission", str(commission))
-    await set_setting("currency_name", currency)
-    await interaction.response.send_message(f"Commission set to {commission}% and currency set to {currency}.", ephemeral=True)
+    
+    try:
+        history = await db.get_auction_history(interaction.guild_id, limit)
+        await prime_settings([interaction.guild_id])
+        
+        if not history:
+            await interaction.followup.send("📭 لا توجد مزادات سابقة", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="📚 سجل المزادات",
+            description=f"آخر {len(history)} مزاد",
+            color=0x3498db
+        )
+        
+        for i, auction_data in enumerate(history, start=1):
+            auction_id = auction_data.get('id')
+            started_at = auction_data.get('started_at')
+            winner_id = auction_data.get('winner_id')
+            final_price = auction_data.get('current_price')
+            cancelled = auction_data.get('cancelled', False)
+            
+            if isinstance(started_at, str):
+                started_at = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+            date_str = started_at.strftime("%Y-%m-%d %H:%M") if started_at else "N/A"
+            
+            if cancelled:
+                status = "🚫 ملغي"
+                winner_str = "تم الإلغاء"
+            elif winner_id:
+                status = "✅ مكتمل"
+                winner_str = f"<@{winner_id}>"
+            else:
+                status = "❌ لم يتم البيع"
+                winner_str = "لا يوجد"
+            
+            value_text = f"**التاريخ:** {date_str}\\n**الحالة:** {status}\\n**الفائز:** {winner_str}\\n**السعر:** {fmt_price(final_price or 0, interaction.guild_id)}"
+            
+            embed.add_field(name=f"#{auction_id}", value=value_text, inline=False)
+        
+        embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        
+    except Exception as e:
+        logger.error(f"Error fetching history: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء جلب السجل", ephemeral=True)
 
-@tree.command(name="config_show", description="عرض إعدادات البوت الحالية داخل السيرفر (Show bot config).")
-async def config_show(interaction: discord.Interaction):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute this command in the server.", ephemeral=True)
+@tree.command(name="تصدير_مزادات", description="تصدير بيانات المزادات كملف CSV (إدارة فقط)")
+@app_commands.describe(limit="عدد المزادات (افتراضي: 100)")
+async def cmd_export_auctions(interaction: discord.Interaction, limit: int = 100):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
         return
-    s = await all_settings()
-    if not s:
-        await interaction.response.send_message("No settings configured yet.", ephemeral=True)
+    
+    if limit < 1 or limit > 500:
+        await interaction.followup.send("❌ الحد الأدنى 1 والحد الأقصى 500", ephemeral=True)
         return
-    lines = []
-    for k, v in s.items():
-        lines.append(f"**{k}**: {v}")
-    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+    
+    try:
+        auctions = await db.get_auction_history(interaction.guild_id, limit)
+        
+        if not auctions:
+            await interaction.followup.send("📭 لا توجد بيانات للتصدير", ephemeral=True)
+            return
+        
+        output = StringIO()
+        writer = csv.writer(output)
+        
+        writer.writerow([
+            'Auction ID', 'Started At', 'Ended At', 'Duration (min)',
+            'Start Price', 'Final Price', 'Winner ID', 'Winner Name',
+            'Creator ID', 'Total Bids', 'Status'
+        ])
+        
+        for auction_data in auctions:
+            auction_id = auction_data.get('id')
+            started_at = auction_data.get('started_at')
+            ended_at = auction_data.get('ended_at')
+            start_price = auction_data.get('start_price', 0)
+            final_price = auction_data.get('current_price', 0)
+            winner_id = auction_data.get('winner_id')
+            creator_id = auction_data.get('created_by')
+            cancelled = auction_data.get('cancelled', False)
+            
+            duration = "N/A"
+            if started_at and ended_at:
+                if isinstance(started_at, str):
+                    started_at = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+                if isinstance(ended_at, str):
+                    ended_at = datetime.fromisoformat(ended_at.replace('Z', '+00:00'))
+                duration_delta = ended_at - started_at
+                duration = round(duration_delta.total_seconds() / 60, 2)
+            
+            winner_username = "N/A"
+            if winner_id:
+                try:
+                    winner = await bot.fetch_user(winner_id)
+                    winner_username = str(winner)
+                except:
+                    winner_username = f"User#{winner_id}"
+            
+            bids = await db.get_bids_for_auction(auction_id)
+            total_bids = len(bids)
+            
+            status = "Cancelled" if cancelled else ("Completed" if winner_id else "No Sale")
+            
+            writer.writerow([
+                auction_id,
+                started_at.isoformat() if started_at else "N/A",
+                ended_at.isoformat() if ended_at else "N/A",
+                duration,
+                start_price,
+                final_price,
+                winner_id or "N/A",
+                winner_username,
+                creator_id or "N/A",
+                total_bids,
+                status
+            ])
+        
+        output.seek(0)
+        filename = f"auctions_{interaction.guild.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        file = discord.File(fp=output, filename=filename)
+        
+        await interaction.followup.send(
+            f"✅ تم تصدير {len(auctions)} مزاد",
+            file=file,
+            ephemeral=True
+        )
+        
+    except Exception as e:
+        logger.error(f"Error exporting auctions: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء التصدير", ephemeral=True)
 
-# -------------------------
-# AUCTION MANAGEMENT COMMANDS (English names, Arabic descriptions)
-# -------------------------
+@tree.command(name="نسخة_احتياطية", description="نسخة احتياطية كاملة لمزادات السيرفر ومزايداته (إدارة فقط)")
+async def cmd_backup(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
+        return
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = f"auctions_backup_{interaction.guild_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.bak.gz"
+            path = os.path.join(tmp, filename)
+            counts = await db.backup_to_file(path, interaction.guild_id)
+            
+            size = os.path.getsize(path)
+            if size > interaction.guild.filesize_limit:
+                await interaction.followup.send(
+                    f"❌ حجم النسخة ({size / 1_048_576:.1f}MB) أكبر من حد الرفع، استخدم `python backup.py dump`",
+                    ephemeral=True
+                )
+                return
+            
+            embed = discord.Embed(title="💾 نسخة احتياطية", color=0x2ecc71)
+            embed.add_field(name="المزادات", value=f"{counts['auctions']:,}", inline=True)
+            embed.add_field(name="المزايدات", value=f"{counts['bids']:,}", inline=True)
+            embed.add_field(name="الحجم", value=f"{size / 1024:.1f}KB", inline=True)
+            embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+            await interaction.followup.send(embed=embed, file=discord.File(path, filename=filename), ephemeral=True)
+        
+    except Exception as e:
+        logger.error(f"Error creating backup: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء إنشاء النسخة", ephemeral=True)
 
-@tree.command(name="auction_open", description="فتح مزاد جديد و إنشاء لوحة المزاد.")
-@app_commands.describe(start_bid="سعر البداية (e.g. 250k)", min_increment="أقل زيادة (e.g. 50k)", duration_minutes="مدة المزاد بالدقائق", secret="الرمز السري لفتح أكثر من مزاد (اختياري)")
-async def auction_open(interaction: discord.Interaction, start_bid: str, min_increment: str, duration_minutes: int = DEFAULT_AUCTION_DURATION_MIN, secret: str = ""):
-    if interaction.guild is None:
-        await interaction.response.send_message("Execute in the server.", ephemeral=True)
+@tree.command(name="استعادة_نسخة", description="دمج نسخة احتياطية في بيانات السيرفر (إدارة فقط)")
+@app_commands.describe(file="ملف النسخة (.bak.gz)")
+async def cmd_restore(interaction: discord.Interaction, file: discord.Attachment):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
+        return
+    
+    if shutdown.closing:
+        await interaction.followup.send(router.gate_message, ephemeral=True)
+        return
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # الاسم يحدد الضغط (.gz)، لذلك نحتفظ بامتداد الملف الأصلي
+            path = os.path.join(tmp, "restore.bak.gz" if file.filename.endswith(".gz") else "restore.bak")
+            await file.save(path)
+            async with shutdown.guard():
+                channel_ids = [c.id for c in interaction.guild.channels] + [t.id for t in interaction.guild.threads]
+                counts = await db.restore_from_file(path, interaction.guild_id, channel_ids)
+    except ShutdownInProgress:
+        await interaction.followup.send(router.gate_message, ephemeral=True)
         return
+    except ValueError as e:
+        await interaction.followup.send(f"❌ ملف غير صالح: {e}", ephemeral=True)
+        return
+    except Exception as e:
+        logger.error(f"Error restoring backup: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء الاستعادة", ephemeral=True)
+        return
+    
+    guild_settings.forget(interaction.guild_id)
+    # المزادات غير المنتهية في النسخة تُستأنف فوراً
+    await restore_auctions()
+    
+    embed = discord.Embed(title="♻️ تمت الاستعادة", color=0x2ecc71)
+    embed.add_field(name="المزادات", value=f"{counts['auctions']:,}", inline=True)
+    embed.add_field(name="المزايدات", value=f"{counts['bids']:,}", inline=True)
+    embed.add_field(name="الإعدادات", value="✅" if counts['guild_settings'] else "—", inline=True)
+    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
-    # check allowed guild configured
-    allowed = await get_setting("server_id")
-    if allowed and int(allowed) != interaction.guild.id:
-        await interaction.response.send_message("This bot is restricted to the configured server.", ephemeral=True)
+@tree.command(name="تحليلات_المزادات", description="تحليلات المزادات والمزايدين مع ملف CSV (إدارة فقط)")
+@app_commands.describe(days="عدد الأيام (افتراضي: 30، و 0 = الكل)")
+async def cmd_auction_analytics(interaction: discord.Interaction, days: int = 30):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
         return
+    
+    if days < 0:
+        await interaction.followup.send("❌ عدد الأيام غير صحيح", ephemeral=True)
+        return
+    
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    
+    try:
+        result = await analytics.analyze_guild(interaction.guild_id, since=since)
+        
+        if not result['auctions']:
+            await interaction.followup.send("📭 لا توجد مزادات منتهية في هذه الفترة", ephemeral=True)
+            return
+        
+        embed = discord.Embed(
+            title="📈 تحليلات المزادات",
+            description=f"آخر {days} يوم" if days else "كل المزادات",
+            color=0x3498db
+        )
+        embed.add_field(name="المزادات", value=str(result['auctions']), inline=True)
+        embed.add_field(name="المزايدات", value=str(result['bids']), inline=True)
+        embed.add_field(name="المزايدين", value=str(len(result['users']['user_id'])), inline=True)
+        embed.add_field(
+            name="⚡ سرعة المزايدة",
+            value=f"المتوسط: {result['avg_velocity']:.2f}/د | الوسيط: {result['median_velocity']:.2f}/د",
+            inline=False
+        )
+        embed.add_field(
+            name="🎯 القنص",
+            value=(
+                f"مزادات حُسمت في آخر {analytics.SNIPE_WINDOW}ث: {result['sniping_ratio'] * 100:.1f}%\n"
+                f"مزايدات آخر {analytics.SNIPE_WINDOW}ث: {result['late_bid_share'] * 100:.1f}%"
+            ),
+            inline=False
+        )
+        curve = " → ".join(f"{v:.2f}x" for v in result['curve'])
+        embed.add_field(name="📉 منحنى السعر (مقابل سعر البداية)", value=curve, inline=False)
+        embed.add_field(name="💰 متوسط السعر النهائي", value=f"{result['avg_final_ratio']:.2f}x", inline=True)
+        embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+        
+        output = analytics.users_to_csv(result)
+        filename = f"analytics_{interaction.guild.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        file = discord.File(fp=output, filename=filename)
+        
+        await interaction.followup.send(embed=embed, file=file, ephemeral=True)
+        
+    except Exception as e:
+        logger.error(f"Error computing analytics: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء حساب التحليلات", ephemeral=True)
 
-    # permission: only members with role OR manage_guild OR secret can open
-    role_id = await get_setting("role_id")
-    role_ok = False
-    if role_id:
-        role_id = int(role_id)
-        role_ok = any(r.id == role_id for r in interaction.user.roles)
-    current_secret = await get_setting("secret_code") or ""
-    if not (role_ok or interaction.user.guild_permissions.manage_guild or secret == current_secret):
-        await interaction.response.send_message("You don't have permission to open an auction.", ephemeral=True)
+@tree.command(name="تشخيص", description="تشخيص أداء البوت: تأخر الـ loop والتوقيتات والـ profiling (إدارة فقط)")
+@app_commands.describe(action="نوع التقرير", seconds="مدة أخذ العينات بالثواني (stacks / cprofile)")
+@app_commands.choices(action=[
+    app_commands.Choice(name="إحصائيات", value="stats"),
+    app_commands.Choice(name="عينات stack", value="stacks"),
+    app_commands.Choice(name="cProfile", value="cprofile"),
+])
+async def cmd_diagnostics(interaction: discord.Interaction, action: str = "stats", seconds: int = 10):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
+        return
+    
+    if seconds < 1 or seconds > 60:
+        await interaction.followup.send("❌ الحد الأدنى 1 والحد الأقصى 60 ثانية", ephemeral=True)
         return
+    
+    try:
+        if action == "stacks":
+            report = await profiler.sample_stacks(monitor.loop_thread_id, seconds)
+        elif action == "cprofile":
+            report = await profiler.run_cprofile(seconds)
+        else:
+            lines = ["# Routes"]
+            for prefix, st in router.stats().items():
+                lines.append(
+                    f"{prefix}: calls={st['calls']} avg={st['avg_ms']:.1f}ms "
+                    f"max={st['max_ms']:.1f}ms deferred={st['deferred']} errors={st['errors']}"
+                )
+            lines.append("")
+            lines.append("# Timings" + ("" if profiler.enabled else " (PROFILING disabled)"))
+            lines.append(profiler.report())
+            if monitor.last_block_stack:
+                lines.append("")
+                lines.append("# Last blocked stack")
+                lines.append(monitor.last_block_stack)
+            report = "\n".join(lines)
+        
+        lag = monitor.stats()
+        embed = discord.Embed(title="🩺 تشخيص الأداء", color=0x3498db)
+        embed.add_field(
+            name="⏱️ تأخر الـ Event Loop",
+            value=f"الحالي: {lag['last_ms']:.1f}ms | الأقصى: {lag['max_ms']:.1f}ms | المتوسط: {lag['avg_ms']:.1f}ms",
+            inline=False
+        )
+        embed.add_field(name="🧱 مرات التوقف", value=str(lag['blocked']), inline=True)
+        embed.add_field(name="🔬 Profiling", value="مفعّل" if profiler.enabled else "غير مفعّل", inline=True)
+        embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+        
+        filename = f"diagnostics_{action}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        file = discord.File(fp=BytesIO((report or "empty").encode('utf-8')), filename=filename)
+        await interaction.followup.send(embed=embed, file=file, ephemeral=True)
+        
+    except Exception as e:
+        logger.error(f"Error running diagnostics: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء التشخيص", ephemeral=True)
 
-    # check if there's already an active auction
-    active = await get_active_auction()
-    if active:
-        await interaction.response.send_message("يوجد بالفعل مزاد نشط.", ephemeral=True)
+@tree.command(name="إعدادات_السيرفر", description="عرض أو تعديل إعدادات المزادات لهذا السيرفر (إدارة فقط)")
+@app_commands.describe(
+    log_channel="روم تقارير المزادات",
+    bidder_role="الرتبة المسموح لها بالمزايدة",
+    currency="اسم العملة (مثال: كريدت)",
+    commission="نسبة العمولة من سعر البيع (0-100)",
+    max_active="الحد الأقصى للمزادات النشطة (1-25)",
+    reset="إرجاع إعداد للقيمة الافتراضية"
+)
+@app_commands.choices(reset=[
+    app_commands.Choice(name="روم اللوق", value="log_channel_id"),
+    app_commands.Choice(name="رتبة المزايدين", value="bidder_role_id"),
+    app_commands.Choice(name="العملة", value="currency_name"),
+    app_commands.Choice(name="العمولة", value="commission"),
+    app_commands.Choice(name="أقصى مزادات نشطة", value="max_active_auctions"),
+    app_commands.Choice(name="الكل", value="all"),
+])
+async def cmd_guild_settings(
+    interaction: discord.Interaction,
+    log_channel: Optional[discord.TextChannel] = None,
+    bidder_role: Optional[discord.Role] = None,
+    currency: Optional[str] = None,
+    commission: Optional[app_commands.Range[int, 0, 100]] = None,
+    max_active: Optional[app_commands.Range[int, 1, 25]] = None,
+    reset: Optional[str] = None
+):
+    await interaction.response.defer(ephemeral=True)
+    
+    if not interaction.user.guild_permissions.manage_guild:
+        await interaction.followup.send("❌ تحتاج صلاحيات إدارة", ephemeral=True)
         return
+    
+    # NULL في قاعدة البيانات = القيمة الافتراضية، والقيم المرسلة مع reset لها الأولوية
+    values = {}
+    if reset is not None:
+        values = {c: None for c in (db.GUILD_SETTING_COLUMNS if reset == "all" else (reset,))}
+    if log_channel is not None:
+        values['log_channel_id'] = log_channel.id
+    if bidder_role is not None:
+        values['bidder_role_id'] = bidder_role.id
+    if currency is not None:
+        values['currency_name'] = currency.strip()[:20]
+    if commission is not None:
+        values['commission'] = commission
+    if max_active is not None:
+        values['max_active_auctions'] = max_active
+    
+    try:
+        if values:
+            settings = await guild_settings.update(interaction.guild_id, **values)
+        else:
+            settings = await guild_settings.get(interaction.guild_id)
+    except Exception as e:
+        logger.error(f"Error updating guild settings: {e}")
+        await interaction.followup.send("❌ حدث خطأ أثناء حفظ الإعدادات", ephemeral=True)
+        return
+    
+    embed = discord.Embed(
+        title="⚙️ إعدادات السيرفر" + (" - تم الحفظ" if values else ""),
+        color=0x2ecc71 if values else 0x3498db
+    )
+    log_id = settings['log_channel_id']
+    role_id = settings['bidder_role_id']
+    embed.add_field(name="📜 روم اللوق", value=f"<#{log_id}>" if log_id else "غير محدد", inline=True)
+    embed.add_field(name="🎭 رتبة المزايدين", value=f"<@&{role_id}>" if role_id else "الجميع", inline=True)
+    embed.add_field(name="💱 العملة", value=settings['currency_name'] or "بدون", inline=True)
+    embed.add_field(name="💸 العمولة", value=f"{settings['commission']}%", inline=True)
+    max_active_auctions = settings['max_active_auctions']
+    embed.add_field(
+        name="🔥 أقصى مزادات نشطة",
+        value=str(max_active_auctions) if max_active_auctions is not None else "غير محدود",
+        inline=True
+    )
+    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
-    # parse amounts
+# ==================== 🎯 EVENTS ====================
+
+@bot.event
+async def on_ready():
     try:
-        sb = parse_amount(start_bid)
-        mi = parse_amount(min_increment)
-    except Exception:
-        await interaction.response.send_message("Invalid number format. Use examples: 250k / 50k", ephemeral=True)
-        return
-
-    ends_at = int((__import__("time").time()) + duration_minutes * 60)
-    record = await create_auction(interaction.user.id, sb, mi, ends_at)
-
-    # post panel in auction channel
-    ch_id = await get_setting("auction_channel_id")
-    currency = await get_setting("currency_name") or DEFAULT_CURRENCY
-    if ch_id:
-        ch = bot.get_channel(int(ch_id))
-        if ch:
-            embed = build_auction_embed(record, currency_name=currency)
-            view = AuctionView(record["id"])
-            await ch.send(embed=embed, view=view)
-    await interaction.response.send_message(f"Auction opened with start {fmt_amount(sb)}.", ephemeral=True)
-
-@tree.command(name="auction_end", description="إنهاء المزاد وإعلان الفائز + تقرير اللوق")
-async def auction_end(interaction: discord.Interaction):
-    role_id = await get_setting("role_id")
-    role_ok = False
-    if role_id:
-        role_ok = any(r.id == int(role_id) for r in interaction.user.roles)
-    if not (role_ok or interaction.user.guild_permissions.manage_guild):
-        await interaction.response.send_message("You don't have permission.", ephemeral=True)
-        return
-    res = await end_current_auction(bot)
-    if res is None:
-        await interaction.response.send_message("No active auction found.", ephemeral=True)
-    else:
-        await interaction.response.send_message("Auction ended and logged.", ephemeral=True)
-
-@tree.command(name="auction_undo_last", description="حذف آخر مزايدة (للإدارة فقط)")
-async def auction_undo_last(interaction: discord.Interaction):
-    role_id = await get_setting("role_id")
-    role_ok = False
-    if role_id:
-        role_ok = any(r.id == int(role_id) for r in interaction.user.roles)
-    if not (role_ok or interaction.user.guild_permissions.manage_guild):
-        await interaction.response.send_message("You don't have permission.", ephemeral=True)
-        return
-    from database import get_active_auction as db_get_active, undo_last_bid
-    active = await db_get_active()
-    if not active:
-        await interaction.response.send_message("No active auction.", ephemeral=True)
-        return
-    undone = await undo_last_bid(active["id"])
-    if undone:
-        await interaction.response.send_message("Last bid removed.", ephemeral=True)
-    else:
-        await interaction.response.send_message("No bids to remove.", ephemeral=True)
-
-@tree.command(name="auction_reset", description="تصفير المزاد بالكامل (خطر)")
-@app_commands.describe(secret="Secret code is required to force reset")
-async def auction_reset(interaction: discord.Interaction, secret: str):
-    current_secret = await get_setting("secret_code") or ""
-    if secret != current_secret and not interaction.user.guild_permissions.manage_guild:
-        await interaction.response.send_message("Invalid secret or insufficient permission.", ephemeral=True)
-        return
-    active = await get_active_auction()
-    if not active:
-        await interaction.response.send_message("No active auction.", ephemeral=True)
-        return
-    # force end with no winner
-    await end_current_auction(bot)  # end_current_auction will mark and log
-    await interaction.response.send_message("Active auction force-ended.", ephemeral=True)
-
-# -------------------------
-# Interaction handling for buttons & modals
-# -------------------------
+        logger.info("=" * 60)
+        logger.info("🚀 STARTING AUCTIONBOT...")
+        logger.info("=" * 60)
+        
+        logger.info("📊 Connecting to database...")
+        await db.init_pool(DATABASE_URL, DATABASE_REPLICA_URL or None)
+        await db.create_tables()
+        logger.info("✅ Database connected successfully!")
+        
+        monitor.start()
+        if PROFILING:
+            profiler.enable(tree, router, {'db': db})
+        
+        scheduler.start()
+        scheduler.start_ticker(active_auctions, refresh_countdown)
+        await restore_auctions()
+        
+        if ALLOWED_GUILD_ID:
+            logger.info(f"🔒 Guild Lock ENABLED (IDs: {sorted(ALLOWED_GUILD_ID)})")
+            
+            guilds_to_leave = []
+            for guild in bot.guilds:
+                if guild.id not in ALLOWED_GUILD_ID:
+                    logger.warning(f"🚫 Unauthorized guild detected: {guild.name} (ID: {guild.id})")
+                    guilds_to_leave.append(guild)
+            
+            for guild in guilds_to_leave:
+                try:
+                    logger.info(f"🚪 Leaving: {guild.name}")
+                    await guild.leave()
+                    logger.info(f"✅ Left successfully")
+                except Exception as e:
+                    logger.error(f"❌ Error leaving guild: {e}")
+        else:
+            logger.warning("⚠️ Guild Lock DISABLED - Bot will work in any server")
+        
+        logger.info("🔄 Syncing commands...")
+        await tree.sync()
+        logger.info("✅ Commands synced!")
+        
+        logger.info("=" * 60)
+        logger.info("🎉 BOT IS READY AND OPERATIONAL!")
+        logger.info(f"👤 Logged in as: {bot.user}")
+        logger.info(f"🆔 Bot ID: {bot.user.id}")
+        logger.info(f"🌐 Servers: {len(bot.guilds)}")
+        logger.info(f"📊 Database: Connected")
+        if ALLOWED_GUILD_ID:
+            logger.info(f"🔒 Guild Lock: ACTIVE")
+        logger.info("=" * 60)
+        logger.info("")
+        logger.info("✅✅✅ نجحنا! البوت شغال 100% ✅✅✅")
+        logger.info("")
+        logger.info("=" * 60)
+        
+    except Exception as e:
+        logger.critical("=" * 60)
+        logger.critical("❌❌❌ فشلنا! حدث خطأ ❌❌❌")
+        logger.critical(f"Error: {e}")
+        logger.critical(traceback.format_exc())
+        logger.critical("=" * 60)
+
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    if ALLOWED_GUILD_ID and guild.id not in ALLOWED_GUILD_ID:
+        logger.warning(f"🚫 Attempted join to unauthorized guild: {guild.name}")
+        
+        try:
+            for channel in guild.text_channels:
+                if channel.permissions_for(guild.me).send_messages:
+                    embed = discord.Embed(
+                        title="🚫 غير مصرح",
+                        description="عذراً، هذا البوت خاص ومقتصر على سيرفر معين.",
+                        color=0xe74c3c
+                    )
+                    embed.set_footer(text="السماء الجنوبية | نظام المزادات")
+                    await channel.send(embed=embed)
+                    break
+        except:
+            pass
+        
+        await guild.leave()
+        logger.info(f"✅ Left unauthorized guild: {guild.name}")
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_settings.forget(guild.id)
+
 @bot.event
 async def on_interaction(interaction: discord.Interaction):
-    try:
-        data = getattr(interaction, "data", {}) or {}
-        cid = data.get("custom_id", "")
-        if cid and cid.startswith("bid_"):
-            parts = cid.split("_")
-            if len(parts) >= 3:
-                typ = parts[1]
-                auction_id = int(parts[2])
-                if typ == "1k":
-                    await handle_bid(interaction, auction_id, 1_000)
-                    return
-                if typ == "100k":
-                    await handle_bid(interaction, auction_id, 100_000)
-                    return
-                if typ == "500k":
-                    await handle_bid(interaction, auction_id, 500_000)
-                    return
-                if typ == "custom":
-                    # create modal from auctions module
-                    from auctions import BidModal
-                    modal = BidModal(auction_id)
-                    await interaction.response.send_modal(modal)
-                    return
-    except Exception:
-        traceback.print_exc()
-    # fall back to processing other application commands
-    await bot.process_application_commands(interaction)
-
-# Run
+    if interaction.type in (discord.InteractionType.component, discord.InteractionType.modal_submit):
+        await router.dispatch(interaction)
+
+@bot.event
+async def on_error(event: str, *args, **kwargs):
+    logger.error(f"❌ Error in {event}:")
+    logger.error(traceback.format_exc())
+
+# ==================== 🚀 RUN BOT ====================
+
+def setup_shutdown():
+    """خطوات الإيقاف الآمن عند SIGTERM"""
+    shutdown.add_step("panels", scheduler.flush)
+    shutdown.add_step("scheduler", lambda remaining: scheduler.stop())
+    shutdown.add_step("database", lambda remaining: db.close_pool())
+    shutdown.add_step("discord", lambda remaining: bot.close())
+    shutdown.install()
+
+async def run_bot():
+    max_retries = 5
+    retry_count = 0
+    setup_shutdown()
+    
+    while retry_count < max_retries and not shutdown.closing:
+        try:
+            logger.info(f"🔌 Connecting to Discord... (Attempt {retry_count + 1}/{max_retries})")
+            
+            async with bot:
+                await bot.start(TOKEN)
+            
+            if shutdown.closing:
+                break
+                
+        except discord.LoginFailure:
+            logger.critical("=" * 60)
+            logger.critical("❌❌❌ فشلنا! Discord Token خاطئ ❌❌❌")
+            logger.critical("=" * 60)
+            logger.critical("💡 تحقق من DISCORD_TOKEN في Railway")
+            break
+            
+        except discord.HTTPException as e:
+            retry_count += 1
+            
+            if e.status == 429:
+                wait_time = retry_after(e, default=30 * retry_count)
+                scheduler.note_rate_limit(e)
+                logger.warning(f"⚠️ Rate limited! Waiting {wait_time:.0f}s...")
+                await asyncio.sleep(wait_time)
+            else:
+                wait_time = 10 * retry_count
+                logger.error(f"❌ HTTP Error {e.status}: {e}")
+                logger.info(f"⏳ Retrying in {wait_time}s...")
+                await asyncio.sleep(wait_time)
+                
+        except Exception as e:
+            retry_count += 1
+            logger.error(f"❌ Error: {type(e).__name__}: {e}")
+            logger.error(traceback.format_exc())
+            
+            if retry_count < max_retries:
+                wait_time = 10 * retry_count
+                logger.info(f"⏳ Retrying in {wait_time}s...")
+                await asyncio.sleep(wait_time)
+            else:
+                logger.critical("=" * 60)
+                logger.critical("❌❌❌ فشلنا! وصلنا للحد الأقصى من المحاولات ❌❌❌")
+                logger.critical("=" * 60)
+                break
+    
+    if shutdown.closing:
+        await shutdown.trigger()
+    
+    logger.info("🛑 Bot shutdown")
+
+# ==================== 🎬 MAIN ====================
+
 if __name__ == "__main__":
-    if not BOT_TOKEN:
-        print("BOT_TOKEN not set in environment. Exiting.")
-    else:
-        bot.run(BOT_TOKEN)
+    try:
+        if len(TOKEN) < 50:
+            print("=" * 60)
+            print("❌❌❌ فشلنا! DISCORD_TOKEN غير صحيح ❌❌❌")
+            print("=" * 60)
+            print(f"Token length: {len(TOKEN)}")
+            print("💡 تأكد من إضافة Token صحيح في Railway")
+            sys.exit(1)
+        
+        asyncio.run(run_bot())
+        
+    except KeyboardInterrupt:
+        logger.info("⚠️ Bot stopped by user")
+    except Exception as e:
+        logger.critical("=" * 60)
+        logger.critical("❌❌❌ فشلنا! خطأ فادح ❌❌❌")
+        logger.critical(f"Error: {e}")
+        logger.critical(traceback.format_exc())
+        logger.critical("=" * 60)
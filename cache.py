@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧠 Query Cache - AuctionBot
+كاش لنتائج الاستعلامات مع TTL و LRU ودمج الطلبات المتزامنة
+
+المطور: دارك
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Set
+
+
+class _LoaderCancelled(Exception):
+    """يُرسل للمنتظرين عند إلغاء الطلب الذي كان يحمّل النتيجة"""
+
+
+class QueryCache:
+    """
+    كاش async محدود الحجم:
+    - كل مدخل ينتهي بعد ttl ثانية
+    - عند امتلاء الكاش يُحذف الأقدم استخداماً (LRU)
+    - الطلبات المتطابقة المتزامنة تنتظر استعلاماً واحداً
+    - الحذف يتم عبر tags (مثلاً ('guild', id))
+    - recently_invalidated يخبر إن كانت النسخة المتماثلة (replica) قد تكون متأخرة عن الحذف
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024, stale_window: float = 5.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_window = stale_window
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._inflight: Dict[Hashable, tuple] = {}
+        # رقم آخر invalidate لكل tag (يُفرّغ عند عدم وجود تحميل جارٍ)
+        self._seq = 0
+        self._tag_seq: Dict[Hashable, int] = {}
+        self._loads = 0
+        self._cleared = 0
+        # وقت آخر invalidate لكل tag خلال stale_window
+        self._recent: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        tags: Iterable[Hashable],
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """إرجاع النتيجة من الكاش أو تنفيذ loader مرة واحدة لكل المنتظرين"""
+        tags = tuple(tags)
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value, _ = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._drop(key)
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                return await self._load(key, tags, loader)
+
+            self.hits += 1
+            try:
+                return await asyncio.shield(pending[0])
+            except _LoaderCancelled:
+                # أُلغي الطلب الذي كان يحمّل، فأول منتظر متبقٍ يصبح المحمّل الجديد
+                continue
+
+    async def _load(self, key: Hashable, tags: tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (future, tags)
+        started = self._seq
+        self._loads += 1
+        try:
+            value = await loader()
+        except BaseException as e:
+            self._end_load()
+            self._finish(key, future)
+            # إلغاء المحمّل لا يُلغي المنتظرين معه، بل يعيدون المحاولة
+            future.set_exception(_LoaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            # منع تحذير "exception was never retrieved" إذا لم ينتظر أحد
+            future.exception()
+            raise
+
+        self._finish(key, future)
+        # لا نخزن نتيجة بدأت قبل invalidate لأحد tags الخاصة بها لأنها قد تكون قديمة
+        if started >= self._cleared and all(self._tag_seq.get(tag, 0) <= started for tag in tags):
+            self._store(key, tags, value)
+        self._end_load()
+        future.set_result(value)
+        return value
+
+    def recently_invalidated(self, tags: Iterable[Hashable]) -> bool:
+        """هل حُذف أحد الـ tags خلال stale_window (القراءة من replica قد ترجع بيانات قديمة)"""
+        self._prune_recent(time.monotonic())
+        return any(tag in self._recent for tag in tags)
+
+    def invalidate(self, *tags: Hashable):
+        """حذف كل المدخلات المرتبطة بأي من الـ tags"""
+        self._seq += 1
+        now = time.monotonic()
+        targets = set(tags)
+        for tag in targets:
+            if self._loads:
+                self._tag_seq[tag] = self._seq
+            self._recent[tag] = now
+            self._recent.move_to_end(tag)
+            for key in self._tags.pop(tag, ()):
+                self._drop(key)
+        # الطلبات الجارية لنفس الـ tags لن تُشارك مع الطلبات الجديدة
+        for key, (_, key_tags) in list(self._inflight.items()):
+            if targets.intersection(key_tags):
+                del self._inflight[key]
+
+        self._prune_recent(now)
+
+    def clear(self):
+        self._seq += 1
+        self._cleared = self._seq
+        self._recent.clear()
+        self._entries.clear()
+        self._tags.clear()
+        self._inflight.clear()
+
+    def _end_load(self):
+        self._loads -= 1
+        if not self._loads:
+            self._tag_seq = {}
+
+    def _prune_recent(self, now: float):
+        while self._recent:
+            tag, at = next(iter(self._recent.items()))
+            if now - at <= self.stale_window:
+                break
+            del self._recent[tag]
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        pending = self._inflight.get(key)
+        if pending is not None and pending[0] is future:
+            del self._inflight[key]
+
+    def _store(self, key: Hashable, tags: tuple, value: Any):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
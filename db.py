@@ -9,23 +9,52 @@
 """
 
 import asyncpg
-from typing import Optional, List, Dict
+from io import BytesIO
+from typing import Optional, List, Dict, Tuple
 
-# Connection Pool
+import backup
+from cache import QueryCache
+
+# Connection Pools
+# _pool للكتابة فقط (المزايدات وإنشاء/إنهاء المزادات) حتى لا تنتظر خلف الاستعلامات الثقيلة
+# _read_pool للقراءة والتحليلات، ويمكن توجيهه إلى Read Replica
+# _fresh_pool قراءة صغيرة من الـ primary بعد الكتابة مباشرة (فقط عند وجود replica)
 _pool: Optional[asyncpg.pool.Pool] = None
+_read_pool: Optional[asyncpg.pool.Pool] = None
+_fresh_pool: Optional[asyncpg.pool.Pool] = None
 
-async def init_pool(dsn: str):
-    """إنشاء connection pool"""
-    global _pool
+WRITE_POOL_SIZE = 5
+READ_POOL_SIZE = 10
+FRESH_POOL_SIZE = 3
+
+# كاش نتائج السجل والإحصائيات (يُحذف عند إنهاء/إلغاء مزاد أو مزايدة جديدة)
+_cache = QueryCache(ttl=300.0, max_entries=1024)
+
+async def init_pool(dsn: str, read_dsn: Optional[str] = None):
+    """إنشاء connection pools (كتابة + قراءة)"""
+    global _pool, _read_pool, _fresh_pool
     if _pool:
         return _pool
     
     _pool = await asyncpg.create_pool(
         dsn,
+        min_size=2,
+        max_size=WRITE_POOL_SIZE,
+        command_timeout=60
+    )
+    _read_pool = await asyncpg.create_pool(
+        read_dsn or dsn,
         min_size=1,
-        max_size=10,
+        max_size=READ_POOL_SIZE,
         command_timeout=60
     )
+    if read_dsn and read_dsn != dsn:
+        _fresh_pool = await asyncpg.create_pool(
+            dsn,
+            min_size=0,
+            max_size=FRESH_POOL_SIZE,
+            command_timeout=60
+        )
     return _pool
 
 async def create_tables():
@@ -65,6 +94,19 @@ async def create_tables():
             );
         """)
         
+        # جدول إعدادات السيرفرات
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id BIGINT PRIMARY KEY,
+                log_channel_id BIGINT,
+                bidder_role_id BIGINT,
+                currency_name TEXT,
+                commission INTEGER,
+                max_active_auctions INTEGER,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+        """)
+        
         # Indexes لتحسين الأداء
         await conn.execute("""
             CREATE INDEX IF NOT EXISTS idx_auctions_guild_id 
@@ -128,14 +170,42 @@ async def end_auction(auction_id: int, winner_id: Optional[int], final_price: Op
         raise RuntimeError("Database pool not initialized")
     
     async with _pool.acquire() as conn:
-        await conn.execute(
+        guild_id = await conn.fetchval(
             """
             UPDATE auctions
             SET winner_id = $1, current_price = $2, ended = TRUE, ended_at = NOW()
-            WHERE id = $3;
+            WHERE id = $3
+            RETURNING guild_id;
             """,
             winner_id, final_price, auction_id
         )
+    
+    _invalidate_auction(auction_id, guild_id)
+
+async def end_auctions(results: List[tuple]):
+    """إنهاء عدة مزادات في استعلام واحد: [(auction_id, winner_id, final_price), ...]"""
+    global _pool
+    if not _pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    if not results:
+        return
+    
+    ids, winners, prices = zip(*results)
+    async with _pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE auctions AS a
+            SET winner_id = v.winner_id, current_price = v.price, ended = TRUE, ended_at = NOW()
+            FROM unnest($1::int[], $2::bigint[], $3::bigint[]) AS v(id, winner_id, price)
+            WHERE a.id = v.id
+            RETURNING a.id, a.guild_id;
+            """,
+            list(ids), list(winners), list(prices)
+        )
+    
+    for row in rows:
+        _invalidate_auction(row['id'], row['guild_id'])
 
 async def cancel_auction(auction_id: int):
     """إلغاء مزاد"""
@@ -144,22 +214,29 @@ async def cancel_auction(auction_id: int):
         raise RuntimeError("Database pool not initialized")
     
     async with _pool.acquire() as conn:
-        await conn.execute(
+        guild_id = await conn.fetchval(
             """
             UPDATE auctions
             SET cancelled = TRUE, ended = TRUE, ended_at = NOW()
-            WHERE id = $1;
+            WHERE id = $1
+            RETURNING guild_id;
             """,
             auction_id
         )
+    
+    _invalidate_auction(auction_id, guild_id)
 
 async def get_auction_history(guild_id: int, limit: int = 10) -> List[Dict]:
-    """جلب سجل المزادات"""
-    global _pool
-    if not _pool:
-        raise RuntimeError("Database pool not initialized")
-    
-    async with _pool.acquire() as conn:
+    """جلب سجل المزادات (من الكاش إن وُجد)"""
+    tags = [('guild', guild_id)]
+    return await _cache.get_or_load(
+        ('history', guild_id, limit),
+        tags,
+        lambda: _fetch_auction_history(_reader(tags), guild_id, limit)
+    )
+
+async def _fetch_auction_history(pool: asyncpg.pool.Pool, guild_id: int, limit: int) -> List[Dict]:
+    async with pool.acquire() as conn:
         rows = await conn.fetch(
             """
             SELECT 
@@ -176,6 +253,92 @@ async def get_auction_history(guild_id: int, limit: int = 10) -> List[Dict]:
         )
         return [dict(row) for row in rows]
 
+async def get_live_auctions() -> List[Dict]:
+    """جلب المزادات غير المنتهية مع مزايداتها (لاستئنافها بعد إعادة التشغيل)"""
+    global _pool
+    if not _pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    # من الـ primary وليس الـ replica حتى لا تضيع آخر المزايدات
+    async with _pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT
+                id, guild_id, channel_id, message_id,
+                start_price, current_price, min_increase,
+                created_by, started_at, ended_at
+            FROM auctions
+            WHERE ended = FALSE AND cancelled = FALSE
+            ORDER BY id;
+            """
+        )
+        auctions = [dict(row) for row in rows]
+        if not auctions:
+            return auctions
+        
+        bids = await conn.fetch(
+            """
+            SELECT auction_id, user_id, amount, created_at
+            FROM bids
+            WHERE auction_id = ANY($1::int[])
+            ORDER BY auction_id, created_at, id;
+            """,
+            [a['id'] for a in auctions]
+        )
+    
+    by_id = {a['id']: a for a in auctions}
+    for a in auctions:
+        a['bids'] = []
+    for row in bids:
+        by_id[row['auction_id']]['bids'].append(dict(row))
+    return auctions
+
+# ==================== GUILD SETTINGS ====================
+
+GUILD_SETTING_COLUMNS = (
+    'log_channel_id', 'bidder_role_id', 'currency_name',
+    'commission', 'max_active_auctions'
+)
+
+async def get_guild_settings(guild_id: int) -> Optional[Dict]:
+    """جلب إعدادات سيرفر"""
+    global _pool
+    if not _pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    async with _pool.acquire() as conn:
+        row = await conn.fetchrow(
+            f"SELECT {', '.join(GUILD_SETTING_COLUMNS)} FROM guild_settings WHERE guild_id = $1;",
+            guild_id
+        )
+        return dict(row) if row else None
+
+async def set_guild_settings(guild_id: int, values: Dict) -> Dict:
+    """حفظ إعدادات سيرفر (الأعمدة المرسلة فقط) وإرجاع الإعدادات كاملة"""
+    global _pool
+    if not _pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    columns = [c for c in GUILD_SETTING_COLUMNS if c in values]
+    if not columns:
+        raise ValueError("No valid guild settings provided")
+    
+    placeholders = ", ".join(f"${i}" for i in range(2, len(columns) + 2))
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns)
+    
+    async with _pool.acquire() as conn:
+        row = await conn.fetchrow(
+            f"""
+            INSERT INTO guild_settings (guild_id, {', '.join(columns)})
+            VALUES ($1, {placeholders})
+            ON CONFLICT (guild_id) DO UPDATE
+            SET {updates}, updated_at = NOW()
+            RETURNING {', '.join(GUILD_SETTING_COLUMNS)};
+            """,
+            guild_id, *[values[c] for c in columns]
+        )
+        return dict(row)
+
 # ==================== BID OPERATIONS ====================
 
 async def insert_bid(auction_id: int, user_id: int, amount: int):
@@ -195,22 +358,25 @@ async def insert_bid(auction_id: int, user_id: int, amount: int):
         )
         
         # تحديث سعر المزاد
-        await conn.execute(
+        guild_id = await conn.fetchval(
             """
             UPDATE auctions
             SET current_price = $1
-            WHERE id = $2;
+            WHERE id = $2
+            RETURNING guild_id;
             """,
             amount, auction_id
         )
+    
+    _cache.invalidate(('auction', auction_id), ('user', guild_id, user_id))
 
 async def get_bids_for_auction(auction_id: int) -> List[Dict]:
     """جلب مزايدات مزاد معين"""
-    global _pool
-    if not _pool:
+    global _read_pool
+    if not _read_pool:
         raise RuntimeError("Database pool not initialized")
     
-    async with _pool.acquire() as conn:
+    async with _read_pool.acquire() as conn:
         rows = await conn.fetch(
             """
             SELECT user_id, amount, created_at
@@ -225,12 +391,16 @@ async def get_bids_for_auction(auction_id: int) -> List[Dict]:
 # ==================== STATS & ANALYTICS ====================
 
 async def get_auction_stats(auction_id: int) -> Optional[Dict]:
-    """إحصائيات مزاد معين"""
-    global _pool
-    if not _pool:
-        raise RuntimeError("Database pool not initialized")
-    
-    async with _pool.acquire() as conn:
+    """إحصائيات مزاد معين (من الكاش إن وُجد)"""
+    tags = [('auction', auction_id)]
+    return await _cache.get_or_load(
+        ('auction_stats', auction_id),
+        tags,
+        lambda: _fetch_auction_stats(_reader(tags), auction_id)
+    )
+
+async def _fetch_auction_stats(pool: asyncpg.pool.Pool, auction_id: int) -> Optional[Dict]:
+    async with pool.acquire() as conn:
         # بيانات المزاد
         auction = await conn.fetchrow(
             "SELECT * FROM auctions WHERE id = $1;",
@@ -259,12 +429,16 @@ async def get_auction_stats(auction_id: int) -> Optional[Dict]:
         }
 
 async def get_user_stats(guild_id: int, user_id: int) -> Dict:
-    """إحصائيات مستخدم"""
-    global _pool
-    if not _pool:
-        raise RuntimeError("Database pool not initialized")
-    
-    async with _pool.acquire() as conn:
+    """إحصائيات مستخدم (من الكاش إن وُجد)"""
+    tags = [('guild', guild_id), ('user', guild_id, user_id)]
+    return await _cache.get_or_load(
+        ('user_stats', guild_id, user_id),
+        tags,
+        lambda: _fetch_user_stats(_reader(tags), guild_id, user_id)
+    )
+
+async def _fetch_user_stats(pool: asyncpg.pool.Pool, guild_id: int, user_id: int) -> Dict:
+    async with pool.acquire() as conn:
         # عدد الانتصارات
         wins = await conn.fetchval(
             """
@@ -312,11 +486,124 @@ async def get_user_stats(guild_id: int, user_id: int) -> Dict:
             'participated_auctions': participated or 0
         }
 
+# ==================== CACHE ====================
+
+def _reader(tags) -> asyncpg.pool.Pool:
+    """
+    pool القراءة لاستعلام مخزّن في الكاش: بعد invalidate مباشرة نقرأ من الـ primary
+    لأن الـ replica قد لا تحتوي الكتابة بعد، وإلا ستُخزّن نتيجة قديمة طوال الـ TTL.
+    القراءة تتم عبر _fresh_pool وليس _pool حتى لا تنتظر المزايدات خلفها.
+    """
+    if not _read_pool:
+        raise RuntimeError("Database pool not initialized")
+    if _fresh_pool and _cache.recently_invalidated(tags):
+        return _fresh_pool
+    return _read_pool
+
+def _invalidate_auction(auction_id: int, guild_id: Optional[int]):
+    """حذف نتائج الكاش المتأثرة بإنهاء أو إلغاء مزاد"""
+    tags = [('auction', auction_id)]
+    if guild_id is not None:
+        tags.append(('guild', guild_id))
+    _cache.invalidate(*tags)
+
+# ==================== BULK EXPORT ====================
+
+def _guild_range_filter(alias: str, guild_id: int, since, until):
+    """شرط WHERE للسيرفر والفترة (الحدود الفارغة لا تُضاف، فـ COPY لا يقبل NULL كمعامل)"""
+    clauses = [f"{alias}.guild_id = $1", f"{alias}.ended = TRUE", f"{alias}.cancelled = FALSE"]
+    args = [guild_id]
+    if since is not None:
+        args.append(since)
+        clauses.append(f"{alias}.started_at >= ${len(args)}")
+    if until is not None:
+        args.append(until)
+        clauses.append(f"{alias}.started_at < ${len(args)}")
+    return " AND ".join(clauses), args
+
+async def copy_guild_history_binary(guild_id: int, since=None, until=None) -> Tuple[bytes, bytes]:
+    """
+    جلب المزادات المنتهية لسيرفر ومزايداتها كأعمدة bigint (الأوقات بالميكروثانية).
+    الاستعلامان من نفس الـ snapshot حتى لا تظهر مزايدات لمزاد غير موجود في النتيجة.
+    """
+    global _read_pool
+    if not _read_pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    where, args = _guild_range_filter("a", guild_id, since, until)
+    auctions, bids = BytesIO(), BytesIO()
+    
+    async with _read_pool.acquire() as conn:
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            await conn.copy_from_query(
+                f"""
+                SELECT
+                    a.id::bigint,
+                    (EXTRACT(EPOCH FROM a.started_at) * 1000000)::bigint,
+                    (EXTRACT(EPOCH FROM COALESCE(a.ended_at, a.started_at)) * 1000000)::bigint,
+                    a.start_price,
+                    a.current_price,
+                    COALESCE(a.winner_id, 0)
+                FROM auctions a
+                WHERE {where}
+                ORDER BY a.id
+                """,
+                *args, output=auctions, format='binary'
+            )
+            await conn.copy_from_query(
+                f"""
+                SELECT
+                    b.auction_id::bigint,
+                    b.user_id,
+                    b.amount,
+                    (EXTRACT(EPOCH FROM COALESCE(b.created_at, a.started_at)) * 1000000)::bigint
+                FROM bids b
+                JOIN auctions a ON b.auction_id = a.id
+                WHERE {where}
+                ORDER BY b.auction_id, b.created_at, b.id
+                """,
+                *args, output=bids, format='binary'
+            )
+    return auctions.getvalue(), bids.getvalue()
+
+# ==================== BACKUP / RESTORE ====================
+
+async def backup_to_file(path: str, guild_id: Optional[int] = None) -> Dict[str, int]:
+    """نسخة احتياطية كاملة (أو لسيرفر واحد) إلى ملف"""
+    global _read_pool
+    if not _read_pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    async with _read_pool.acquire() as conn:
+        return await backup.dump(conn, path, guild_id)
+
+async def restore_from_file(
+    path: str,
+    guild_id: Optional[int] = None,
+    channel_ids: Optional[List[int]] = None
+) -> Dict[str, int]:
+    """دمج نسخة احتياطية مع إعادة ترقيم IDs المزادات"""
+    global _pool
+    if not _pool:
+        raise RuntimeError("Database pool not initialized")
+    
+    async with _pool.acquire() as conn:
+        counts = await backup.load(conn, path, guild_id, channel_ids)
+    _cache.clear()
+    return counts
+
 # ==================== CLEANUP ====================
 
 async def close_pool():
-    """إغلاق connection pool"""
-    global _pool
+    """إغلاق connection pools"""
+    global _pool, _read_pool, _fresh_pool
+    _cache.clear()
+    if _fresh_pool:
+        await _fresh_pool.close()
+        _fresh_pool = None
+    if _read_pool:
+        await _read_pool.close()
+        _read_pool = None
     if _pool:
         await _pool.close()
         _pool = None
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🏘️ Guild Settings - AuctionBot
+إعدادات لكل سيرفر مع كاش في الذاكرة وتحميل عند أول استخدام
+
+المطور: دارك
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import db
+
+DEFAULT_SETTINGS = {
+    'log_channel_id': None,
+    'bidder_role_id': None,
+    'currency_name': "",
+    'commission': 0,
+    'max_active_auctions': None,   # بدون حد مثل الإصدارات السابقة
+}
+
+MAX_CACHED_GUILDS = 1000
+
+
+class GuildSettingsStore:
+    """
+    الإعدادات تُحمّل من قاعدة البيانات عند أول طلب لكل سيرفر فقط،
+    والسيرفرات غير النشطة تُحذف من الذاكرة (LRU) عند تجاوز الحد.
+    """
+
+    def __init__(self, max_cached: int = MAX_CACHED_GUILDS, fallback: Optional[Dict] = None):
+        self.max_cached = max_cached
+        # قيم افتراضية من البيئة (مثل LOG_CHANNEL_ID) للسيرفرات بدون إعدادات
+        self.fallback = {**DEFAULT_SETTINGS, **{k: v for k, v in (fallback or {}).items() if v is not None}}
+        self._cache: "OrderedDict[int, Dict]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+
+    def _merge(self, row: Optional[Dict]) -> Dict:
+        """الأعمدة NULL (غير المحددة أو التي أُعيدت للافتراضي) تأخذ القيمة الافتراضية"""
+        settings = dict(self.fallback)
+        if row:
+            settings.update({k: v for k, v in row.items() if v is not None})
+        return settings
+
+    def _store(self, guild_id: int, settings: Dict):
+        self._cache[guild_id] = settings
+        self._cache.move_to_end(guild_id)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def get(self, guild_id: int) -> Dict:
+        """إعدادات السيرفر (من الذاكرة أو تحميل مرة واحدة من قاعدة البيانات)"""
+        settings = self._cache.get(guild_id)
+        if settings is not None:
+            self._cache.move_to_end(guild_id)
+            return settings
+
+        pending = self._loading.get(guild_id)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # أُلغي الطلب الذي كان يحمّل (وليس هذا الطلب)، فنحمّل من جديد
+                if not pending.cancelled():
+                    raise
+                return await self.get(guild_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[guild_id] = future
+        try:
+            settings = self._merge(await db.get_guild_settings(guild_id))
+        except BaseException as e:
+            self._loading.pop(guild_id, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+
+        self._loading.pop(guild_id, None)
+        self._store(guild_id, settings)
+        future.set_result(settings)
+        return settings
+
+    def peek(self, guild_id: int) -> Dict:
+        """الإعدادات المحمّلة بدون انتظار (أو الافتراضية إن لم تُحمّل بعد)"""
+        return self._cache.get(guild_id) or self.fallback
+
+    async def update(self, guild_id: int, **values) -> Dict:
+        """حفظ القيم المرسلة فقط، والقيمة None تمسح الإعداد (يرجع للافتراضي)"""
+        row = await db.set_guild_settings(guild_id, values)
+        settings = self._merge(row)
+        self._store(guild_id, settings)
+        return settings
+
+    def forget(self, guild_id: int):
+        self._cache.pop(guild_id, None)
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🩺 Profiling - AuctionBot
+مراقبة تأخر الـ event loop وقياس زمن الأوامر والأزرار ودوال قاعدة البيانات
+
+المطور: دارك
+"""
+
+import asyncio
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger('AuctionBot')
+
+# ==================== ⚙️ SETTINGS ====================
+
+LAG_INTERVAL = 0.5       # فترة قياس تأخر الـ loop
+LAG_WARN = 0.25          # تحذير إذا تأخر الـ loop أكثر من هذا
+BLOCK_THRESHOLD = 1.0    # التقاط الـ stack إذا توقف الـ loop أكثر من هذا
+SAMPLE_INTERVAL = 0.01   # فترة أخذ العينات عند stacks
+
+
+def _format_stack(frame, limit: int = 12) -> str:
+    return "".join(traceback.format_stack(frame, limit=limit))
+
+
+def _collapse_stack(frame) -> str:
+    """تحويل الـ stack لسطر واحد (صيغة flamegraph)"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+# ==================== ⏱️ LOOP MONITOR ====================
+
+class LoopMonitor:
+    """
+    يعمل دائماً:
+    - task داخل الـ loop يقيس التأخر بين المتوقع والفعلي
+    - thread منفصل يلتقط الـ stack إذا توقف الـ loop (callback بطيء)
+    """
+
+    def __init__(self, interval: float = LAG_INTERVAL, warn: float = LAG_WARN, block: float = BLOCK_THRESHOLD):
+        self.interval = interval
+        self.warn = warn
+        self.block = block
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        self.blocked = 0
+        self.last_block_stack = ""
+        self.loop_thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """تشغيل المراقبة (آمن للاستدعاء أكثر من مرة)"""
+        self.loop_thread_id = threading.get_ident()
+        if self._task is None or self._task.done():
+            self._beat = time.monotonic()
+            self._task = asyncio.create_task(self._sample())
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._beat = time.monotonic()
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+            if lag > self.warn:
+                logger.warning(f"🐢 Event loop lag: {lag * 1000:.0f}ms")
+
+    def _watch(self):
+        reported_beat = None
+        while True:
+            time.sleep(self.block / 2)
+            beat = self._beat
+            if time.monotonic() - beat <= self.interval + self.block or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            self.blocked += 1
+            self.last_block_stack = _format_stack(frame)
+            logger.warning(
+                f"🧱 Event loop blocked for >{self.block:.1f}s, current stack:\n{self.last_block_stack}"
+            )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'last_ms': self.last_lag * 1000,
+            'max_ms': self.max_lag * 1000,
+            'avg_ms': (self.total_lag / self.samples * 1000) if self.samples else 0.0,
+            'blocked': self.blocked
+        }
+
+
+# ==================== 🔬 PROFILER ====================
+
+class Profiler:
+    """قياس زمن الدوال (اختياري) وأخذ عينات الـ stack أو cProfile عند الطلب"""
+
+    def __init__(self):
+        self.enabled = False
+        self.timings: Dict[str, List[float]] = {}  # name -> [calls, total, max, errors]
+        self._busy = asyncio.Lock()
+
+    def record(self, name: str, elapsed: float, failed: bool = False):
+        entry = self.timings.get(name)
+        if entry is None:
+            entry = self.timings[name] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        if failed:
+            entry[3] += 1
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """تغليف دالة async بقياس الزمن"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self.record(name, time.perf_counter() - start, failed)
+        return wrapper
+
+    # ---------- instrumentation ----------
+
+    def instrument_module(self, module, prefix: str):
+        """تغليف كل الدوال العامة async في module (مثل db)"""
+        for name, obj in list(vars(module).items()):
+            if not name.startswith('_') and inspect.iscoroutinefunction(obj):
+                setattr(module, name, self.timed(f"{prefix}.{name}", obj))
+
+    def instrument_tree(self, tree):
+        """تغليف callbacks أوامر السلاش"""
+        for command in tree.walk_commands():
+            callback = getattr(command, '_callback', None)
+            if callback is not None:
+                command._callback = self.timed(f"cmd.{command.name}", callback)
+
+    def instrument_router(self, router):
+        router.wrap_handlers(lambda prefix, handler: self.timed(f"route.{prefix}", handler))
+
+    def enable(self, tree, router, modules: Dict[str, Any]):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.instrument_tree(tree)
+        self.instrument_router(router)
+        for prefix, module in modules.items():
+            self.instrument_module(module, prefix)
+        logger.info("🔬 Profiling enabled")
+
+    # ---------- on-demand ----------
+
+    async def sample_stacks(self, thread_id: int, seconds: float, interval: float = SAMPLE_INTERVAL) -> str:
+        """أخذ عينات من stack الـ loop لمدة معينة (صيغة collapsed stacks)"""
+        async with self._busy:
+            def run():
+                counts = Counter()
+                end = time.monotonic() + seconds
+                while time.monotonic() < end:
+                    frame = sys._current_frames().get(thread_id)
+                    if frame is not None:
+                        counts[_collapse_stack(frame)] += 1
+                    time.sleep(interval)
+                return counts
+
+            counts = await asyncio.to_thread(run)
+            return "\n".join(f"{stack} {n}" for stack, n in counts.most_common())
+
+    async def run_cprofile(self, seconds: float, limit: int = 40) -> str:
+        """تشغيل cProfile على الـ loop لمدة معينة"""
+        async with self._busy:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(limit)
+            return output.getvalue()
+
+    def report(self, limit: int = 50) -> str:
+        rows = sorted(self.timings.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+        lines = [f"{'name':<40} {'calls':>7} {'avg ms':>9} {'max ms':>9} {'errors':>7}"]
+        for name, (calls, total, peak, errors) in rows:
+            lines.append(f"{name:<40} {calls:>7} {total / calls * 1000:>9.1f} {peak * 1000:>9.1f} {errors:>7}")
+        return "\n".join(lines)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🗂️ Auction Registry - AuctionBot
+تخزين المزادات النشطة في الذاكرة مع فهارس حسب السيرفر والقناة و DB id
+
+المطور: دارك
+"""
+
+from typing import Any, Dict, Iterator, List
+
+
+class AuctionRegistry:
+    """
+    الخريطة الأساسية: message_id ← auction
+    فهارس ثانوية: guild_id ← {message_id: auction}, channel_id ← {...}, db_id ← auction
+    كل التعديلات متزامنة (بدون await) لذلك تبقى الفهارس متسقة دائماً.
+    """
+
+    def __init__(self):
+        self._by_message: Dict[int, Any] = {}
+        self._by_guild: Dict[int, Dict[int, Any]] = {}
+        self._by_channel: Dict[int, Dict[int, Any]] = {}
+        self._by_db_id: Dict[int, Any] = {}
+
+    def add(self, auction):
+        """تسجيل مزاد (يستبدل أي مزاد بنفس message_id)"""
+        self.remove(auction.message_id)
+        self._by_message[auction.message_id] = auction
+        self._by_guild.setdefault(auction.guild_id, {})[auction.message_id] = auction
+        self._by_channel.setdefault(auction.channel_id, {})[auction.message_id] = auction
+        if auction.db_id is not None:
+            self._by_db_id[auction.db_id] = auction
+
+    def remove(self, message_id: int):
+        """حذف مزاد من الخريطة وكل الفهارس"""
+        auction = self._by_message.pop(message_id, None)
+        if auction is None:
+            return None
+        self._unindex(self._by_guild, auction.guild_id, message_id)
+        self._unindex(self._by_channel, auction.channel_id, message_id)
+        if auction.db_id is not None and self._by_db_id.get(auction.db_id) is auction:
+            del self._by_db_id[auction.db_id]
+        return auction
+
+    @staticmethod
+    def _unindex(index: Dict[int, Dict[int, Any]], key: int, message_id: int):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(message_id, None)
+        if not bucket:
+            del index[key]
+
+    # ---------- lookups ----------
+
+    def get(self, message_id: int):
+        return self._by_message.get(message_id)
+
+    def by_db_id(self, db_id: int):
+        return self._by_db_id.get(db_id)
+
+    def in_guild(self, guild_id: int) -> List[Any]:
+        return list(self._by_guild.get(guild_id, {}).values())
+
+    def in_channel(self, channel_id: int) -> List[Any]:
+        return list(self._by_channel.get(channel_id, {}).values())
+
+    def active_in_guild(self, guild_id: int) -> List[Any]:
+        return [a for a in self._by_guild.get(guild_id, {}).values() if not a.ended and not a.cancelled]
+
+    def active_in_channel(self, channel_id: int) -> List[Any]:
+        return [a for a in self._by_channel.get(channel_id, {}).values() if not a.ended and not a.cancelled]
+
+    def count_in_guild(self, guild_id: int) -> int:
+        return len(self._by_guild.get(guild_id, ()))
+
+    def values(self) -> List[Any]:
+        return list(self._by_message.values())
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self._by_message
+
+    def __len__(self) -> int:
+        return len(self._by_message)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._by_message))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧭 Interaction Router - AuctionBot
+توجيه ضغطات الأزرار ونماذج الإدخال حسب بادئة الـ custom_id مع defer تلقائي وقياس الأداء
+
+المطور: دارك
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger('AuctionBot')
+
+SEPARATOR = ':'
+DEFER_AFTER = 1.5   # ثواني قبل الـ defer التلقائي (Discord يمهل 3 ثواني فقط)
+ERROR_MESSAGE = "❌ حدث خطأ، حاول مرة أخرى"
+
+
+class Route:
+    __slots__ = ('prefix', 'handler', 'converters', 'defer', 'calls', 'total', 'max', 'deferred', 'errors')
+
+    def __init__(self, prefix: str, handler: Callable[..., Awaitable[Any]], converters: Tuple, defer: bool):
+        self.prefix = prefix
+        self.handler = handler
+        self.converters = converters
+        self.defer = defer
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.deferred = 0
+        self.errors = 0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+class InteractionRouter:
+    """
+    جدول توجيه: بادئة custom_id ← handler
+    الصيغة: prefix:arg1:arg2 (مثال: bid.quick:123456)
+    """
+
+    def __init__(
+        self,
+        defer_after: float = DEFER_AFTER,
+        gate: Optional[Callable[[], bool]] = None,
+        gate_message: str = "⏳ البوت يعيد التشغيل الآن، حاول بعد ثوانٍ"
+    ):
+        self.defer_after = defer_after
+        self.gate = gate
+        self.gate_message = gate_message
+        self._routes: Dict[str, Route] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def route(self, prefix: str, *converters: Callable[[str], Any], defer: bool = True):
+        """تسجيل handler لبادئة معينة (defer=False للأزرار التي تفتح Modal)"""
+        if SEPARATOR in prefix:
+            raise ValueError(f"Route prefix must not contain '{SEPARATOR}'")
+
+        def decorator(func):
+            self._routes[prefix] = Route(prefix, func, converters, defer)
+            return func
+        return decorator
+
+    def wrap_handlers(self, wrap: Callable[[str, Callable], Callable]):
+        """تغليف كل handlers المسجلة (يُستخدم للـ profiling)"""
+        for route in self._routes.values():
+            route.handler = wrap(route.prefix, route.handler)
+
+    @staticmethod
+    def custom_id(prefix: str, *args: Any) -> str:
+        return SEPARATOR.join([prefix, *map(str, args)])
+
+    @staticmethod
+    def field(interaction: discord.Interaction, custom_id: str) -> Optional[str]:
+        """قيمة حقل من إرسال Modal (modal_submit)"""
+        for row in (interaction.data or {}).get('components', []):
+            for component in row.get('components', []):
+                if component.get('custom_id') == custom_id:
+                    return component.get('value')
+        return None
+
+    def _resolve(self, custom_id: str) -> Optional[Tuple[Route, list]]:
+        prefix, _, raw = custom_id.partition(SEPARATOR)
+        route = self._routes.get(prefix)
+        if route is None:
+            return None
+        parts = raw.split(SEPARATOR) if raw else []
+        if len(parts) != len(route.converters):
+            return None
+        try:
+            return route, [conv(part) for conv, part in zip(route.converters, parts)]
+        except (TypeError, ValueError):
+            return None
+
+    async def dispatch(self, interaction: discord.Interaction) -> bool:
+        """توجيه التفاعل للـ handler المناسب، ويرجع False إذا لم يوجد مسار"""
+        data = interaction.data or {}
+        custom_id = data.get('custom_id')
+        if not custom_id:
+            return False
+
+        resolved = self._resolve(custom_id)
+        if resolved is None:
+            return False
+        route, args = resolved
+
+        if self.gate is not None and not self.gate():
+            await interaction.response.send_message(self.gate_message, ephemeral=True)
+            return True
+
+        lock = self._locks[interaction.id] = asyncio.Lock()
+        start = time.perf_counter()
+        task = asyncio.create_task(route.handler(interaction, *args))
+        try:
+            if route.defer:
+                done, _ = await asyncio.wait({task}, timeout=self.defer_after)
+                if not done:
+                    async with lock:
+                        if not interaction.response.is_done():
+                            await interaction.response.defer(ephemeral=True, thinking=True)
+                            route.deferred += 1
+            await task
+        except Exception as e:
+            route.errors += 1
+            logger.error(f"❌ Error in route '{route.prefix}': {e}")
+            # الرد حتى لا يرى المستخدم "This interaction failed"
+            try:
+                await self.respond(interaction, ERROR_MESSAGE, ephemeral=True)
+            except Exception as reply_error:
+                logger.error(f"❌ Could not report route error: {reply_error}")
+        finally:
+            self._locks.pop(interaction.id, None)
+            elapsed = time.perf_counter() - start
+            route.record(elapsed)
+            if elapsed > self.defer_after:
+                logger.warning(f"🐢 Slow route '{route.prefix}': {elapsed * 1000:.0f}ms")
+        return True
+
+    async def respond(self, interaction: discord.Interaction, content: Optional[str] = None, **kwargs):
+        """الرد على التفاعل سواء تم الـ defer التلقائي أم لا"""
+        lock = self._locks.get(interaction.id) or asyncio.Lock()
+        async with lock:
+            if interaction.response.is_done():
+                await interaction.followup.send(content, **kwargs)
+            else:
+                await interaction.response.send_message(content, **kwargs)
+
+    def stats(self) -> Dict[str, Dict]:
+        """إحصائيات الأداء لكل مسار"""
+        return {
+            prefix: {
+                'calls': r.calls,
+                'avg_ms': (r.total / r.calls * 1000) if r.calls else 0.0,
+                'max_ms': r.max * 1000,
+                'deferred': r.deferred,
+                'errors': r.errors
+            }
+            for prefix, r in self._routes.items()
+        }
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+⏱️ REST Scheduler - AuctionBot
+جدولة طلبات Discord REST ضمن ميزانية عامة وميزانية لكل قناة
+
+المطور: دارك
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+import aiohttp
+import discord
+
+logger = logging.getLogger('AuctionBot')
+
+# ==================== 🎚️ PRIORITIES ====================
+
+PRIORITY_BID = 0        # تحديث اللوحة بعد مزايدة
+PRIORITY_FINAL = 1      # النتيجة النهائية أو الإلغاء
+PRIORITY_LOG = 2        # تقارير روم اللوق
+PRIORITY_COUNTDOWN = 3  # تحديث الوقت المتبقي
+
+# ==================== 📏 BUDGET ====================
+
+GLOBAL_RATE = 40.0              # طلب/ثانية (حد Discord العام 50)
+GLOBAL_BURST = 10
+CHANNEL_RATE = 1.0              # 5 تعديلات كل 5 ثوانٍ لكل قناة
+CHANNEL_BURST = 5
+MIN_RATE_FACTOR = 0.1           # أقل نسبة من المعدل بعد تكرار 429
+RECOVERY_STEP = 0.05            # نسبة الاسترجاع بعد كل طلب ناجح
+COUNTDOWN_SHARE = 0.5           # حصة العدادات من الميزانية العامة
+COUNTDOWN_MIN_INTERVAL = 15.0   # أقل فترة بين تحديثين لنفس اللوحة
+MAX_ATTEMPTS = 3
+
+_CHANNEL_PATH = re.compile(r'/channels/(\d+)')
+
+
+def retry_after(exc: BaseException, default: float = 5.0) -> float:
+    """استخراج مدة الانتظار من خطأ 429"""
+    value = getattr(exc, 'retry_after', None)
+    if value is None:
+        response = getattr(exc, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        value = headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After')
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _is_global(exc: BaseException) -> bool:
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    return str(headers.get('X-RateLimit-Global', '')).lower() == 'true'
+
+
+class TokenBucket:
+    """دلو توكنات يتكيف مع ردود 429 (تخفيض سريع واسترجاع تدريجي)"""
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated: Optional[float] = None
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """الوقت المتبقي حتى يتوفر توكن"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def penalize(self, now: float, seconds: float):
+        """إيقاف الدلو بعد 429 وتخفيض المعدل للنصف"""
+        self._refill(now)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+
+    def reward(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'channel_id', 'key', 'factory', 'future', 'attempts', 'cancelled')
+
+    def __init__(self, priority, seq, channel_id, key, factory, future):
+        self.priority = priority
+        self.seq = seq
+        self.channel_id = channel_id
+        self.key = key
+        self.factory = factory
+        self.future = future
+        self.attempts = 0
+        self.cancelled = False
+
+
+class RestScheduler:
+    """
+    طابور أولويات لطلبات REST:
+    المزايدات أولاً، ثم النتائج النهائية، ثم اللوق، ثم العدادات.
+    الطلبات بنفس المفتاح تُدمج فيُنفَّذ أحدثها فقط.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        global_burst: int = GLOBAL_BURST,
+        channel_rate: float = CHANNEL_RATE,
+        channel_burst: int = CHANNEL_BURST
+    ):
+        self._global = TokenBucket(global_rate, global_burst)
+        self._channel_rate = channel_rate
+        self._channel_burst = channel_burst
+        self._channels: Dict[int, TokenBucket] = {}
+        self._heap: List = []
+        self._pending: Dict[Hashable, _Job] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._inflight = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._tracing = False
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        """تشغيل المجدول (آمن للاستدعاء أكثر من مرة)"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    def start_ticker(self, targets: Callable[[], Iterable[Any]], refresh: Callable[[Any], Any]):
+        """تشغيل عداد الوقت الموزع على جميع المزادات النشطة"""
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._tick_loop(targets, refresh))
+
+    async def stop(self):
+        for task in (self._ticker, self._worker):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._ticker = None
+        self._worker = None
+
+    async def flush(self, timeout: float):
+        """إيقاف العداد وإلغاء تحديثاته ثم انتظار باقي الطلبات (للإيقاف الآمن)"""
+        if self._ticker and not self._ticker.done():
+            self._ticker.cancel()
+        for _, _, job in self._heap:
+            if job.priority >= PRIORITY_COUNTDOWN and not job.cancelled:
+                job.cancelled = True
+                if job.key is not None and self._pending.get(job.key) is job:
+                    del self._pending[job.key]
+                if not job.future.done():
+                    job.future.set_result(None)
+
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while loop.time() < end:
+            if not self._inflight and all(job.cancelled for _, _, job in self._heap):
+                return
+            await asyncio.sleep(0.05)
+        logger.warning("⚠️ REST queue not empty at flush deadline")
+
+    # ---------- submit ----------
+
+    def submit(
+        self,
+        priority: int,
+        channel_id: int,
+        factory: Callable[[], Awaitable[Any]],
+        key: Optional[Hashable] = None
+    ) -> asyncio.Future:
+        """إضافة طلب للطابور، ويرجع Future بنتيجة الطلب"""
+        if key is not None:
+            job = self._pending.get(key)
+            if job is not None:
+                # طلب أقل أولوية لا يستبدل طلباً أهم (مثل عداد الوقت بعد لوحة الإنهاء)
+                if priority > job.priority:
+                    return job.future
+                job.factory = factory
+                if priority < job.priority:
+                    job.cancelled = True
+                    self._push(priority, channel_id, key, factory, job.future)
+                return job.future
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._push(priority, channel_id, key, factory, future)
+        return future
+
+    def _push(self, priority, channel_id, key, factory, future) -> _Job:
+        job = _Job(priority, next(self._seq), channel_id, key, factory, future)
+        heapq.heappush(self._heap, (job.priority, job.seq, job))
+        if key is not None:
+            self._pending[key] = job
+        self._wakeup.set()
+        return job
+
+    def _requeue(self, job: _Job):
+        if job.key is not None and job.key in self._pending:
+            # طلب أحدث بنفس المفتاح موجود بالفعل
+            if not job.future.done():
+                job.future.set_result(None)
+            return
+        self._push(job.priority, job.channel_id, job.key, job.factory, job.future)
+
+    # ---------- budget ----------
+
+    def _channel(self, channel_id: int) -> TokenBucket:
+        bucket = self._channels.get(channel_id)
+        if bucket is None:
+            bucket = self._channels[channel_id] = TokenBucket(self._channel_rate, self._channel_burst)
+        return bucket
+
+    def countdown_interval(self, count: int) -> float:
+        """الفترة بين تحديثين لنفس اللوحة حسب عدد المزادات والميزانية الحالية"""
+        rate = self._global.rate * COUNTDOWN_SHARE
+        return max(COUNTDOWN_MIN_INTERVAL, count / rate)
+
+    def note_rate_limit(self, exc: BaseException, channel_id: Optional[int] = None) -> float:
+        """تسجيل 429 وتخفيض الميزانية المناسبة"""
+        wait = retry_after(exc)
+        self._penalize(wait, channel_id, channel_id is None or _is_global(exc))
+        return wait
+
+    def _penalize(self, wait: float, channel_id: Optional[int], is_global: bool):
+        now = asyncio.get_running_loop().time()
+        if is_global:
+            self._global.penalize(now, wait)
+        elif channel_id is not None:
+            self._channel(channel_id).penalize(now, wait)
+        else:
+            # 429 لمسار بدون قناة (مثل ردود التفاعلات) لا يخص ميزانياتنا
+            return
+        logger.warning(f"⚠️ Rate limited (channel={channel_id}, global={is_global}), backing off {wait:.1f}s")
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        discord.py يعيد طلبات 429 بنفسه ولا يرفع RateLimited إلا للانتظار الطويل،
+        لذلك نراقب الردود مباشرة من aiohttp (Bot(http_trace=...)).
+        """
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_end(session, context, params):
+            if params.response.status != 429:
+                return
+            headers = params.response.headers
+            match = _CHANNEL_PATH.search(params.url.path)
+            self._penalize(
+                retry_after(SimpleNamespace(response=params.response)),
+                int(match.group(1)) if match else None,
+                str(headers.get('X-RateLimit-Global', '')).lower() == 'true'
+            )
+
+        trace.on_request_end.append(on_request_end)
+        self._tracing = True
+        return trace
+
+    # ---------- worker ----------
+
+    def _next(self, now: float):
+        delay = self._global.delay(now)
+        if delay > 0:
+            return None, delay
+
+        chosen = None
+        wait = None
+        skipped = []
+        while self._heap:
+            _, _, job = heapq.heappop(self._heap)
+            if job.cancelled:
+                continue
+            d = self._channel(job.channel_id).delay(now)
+            if d <= 0:
+                chosen = job
+                break
+            skipped.append(job)
+            wait = d if wait is None else min(wait, d)
+
+        for job in skipped:
+            heapq.heappush(self._heap, (job.priority, job.seq, job))
+        if chosen is not None and chosen.key is not None:
+            self._pending.pop(chosen.key, None)
+        return chosen, wait
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, wait = self._next(loop.time())
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = loop.time()
+            self._global.take(now)
+            self._channel(job.channel_id).take(now)
+            task = asyncio.create_task(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job: _Job):
+        try:
+            result = await job.factory()
+        except (discord.RateLimited, discord.HTTPException) as e:
+            if isinstance(e, discord.HTTPException) and e.status != 429:
+                logger.error(f"❌ REST error ({e.status}): {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            # مع trace_config يكون الـ 429 قد سُجّل بالفعل عند وصول الرد
+            if not self._tracing:
+                self.note_rate_limit(e, job.channel_id)
+            job.attempts += 1
+            if job.attempts < MAX_ATTEMPTS:
+                self._requeue(job)
+            elif not job.future.done():
+                job.future.set_exception(e)
+            return
+        except Exception as e:
+            logger.error(f"❌ Scheduled request failed: {e}")
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+
+        self._global.reward()
+        self._channel(job.channel_id).reward()
+        if not job.future.done():
+            job.future.set_result(result)
+
+    async def _tick_loop(self, targets, refresh):
+        while True:
+            items = list(targets())
+            if not items:
+                await asyncio.sleep(COUNTDOWN_MIN_INTERVAL)
+                continue
+
+            # توزيع التحديثات بالتساوي على الفترة بدل إرسالها دفعة واحدة
+            step = self.countdown_interval(len(items)) / len(items)
+            for item in items:
+                try:
+                    refresh(item)
+                except Exception as e:
+                    logger.error(f"Error scheduling countdown: {e}")
+                await asyncio.sleep(step)
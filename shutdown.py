@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🛑 Shutdown Coordinator - AuctionBot
+إيقاف آمن عند SIGTERM (Railway Redeploy) بدون فقدان مزايدات
+
+المطور: دارك
+"""
+
+import asyncio
+import logging
+import signal
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger('AuctionBot')
+
+SHUTDOWN_DEADLINE = 20.0   # Railway يمهل العملية حوالي 30 ثانية قبل SIGKILL
+
+
+class ShutdownInProgress(RuntimeError):
+    """محاولة بدء عملية كتابة بعد بدء الإيقاف"""
+
+
+class ShutdownCoordinator:
+    """
+    مراحل الإيقاف:
+    1. رفض المزايدات الجديدة فوراً (accepting = False)
+    2. انتظار عمليات الكتابة الجارية (guard)
+    3. تنفيذ الخطوات المسجلة بالترتيب ضمن المهلة
+    """
+
+    def __init__(self, deadline: float = SHUTDOWN_DEADLINE):
+        self.deadline = deadline
+        self.accepting = True
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._steps: List[Tuple[str, Callable[[float], Awaitable]]] = []
+        self._task = None
+
+    @property
+    def closing(self) -> bool:
+        return not self.accepting
+
+    @asynccontextmanager
+    async def guard(self):
+        """
+        تعليم عملية كتابة حرجة حتى ينتظرها الإيقاف.
+        بعد بدء الإيقاف يُرفض الدخول (ShutdownInProgress) لأن الاتصالات قد تُغلق قبل انتهائها.
+        """
+        if not self.accepting:
+            raise ShutdownInProgress("Shutdown in progress")
+        self._active += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.set()
+
+    def add_step(self, name: str, step: Callable[[float], Awaitable]):
+        """تسجيل خطوة إيقاف، تستقبل الوقت المتبقي بالثواني"""
+        self._steps.append((name, step))
+
+    def install(self, sigs=(signal.SIGTERM, signal.SIGINT)):
+        """ربط الإشارات بالإيقاف الآمن"""
+        loop = asyncio.get_running_loop()
+        for sig in sigs:
+            try:
+                loop.add_signal_handler(sig, self.trigger, sig.name)
+            except (NotImplementedError, RuntimeError):
+                # Windows لا يدعم add_signal_handler
+                pass
+
+    def trigger(self, reason: str = "manual"):
+        if self._task is None:
+            logger.warning(f"🛑 Shutdown requested ({reason}), draining...")
+            # الرفض يبدأ فوراً، لا عند أول تشغيل لمهمة الإيقاف
+            self.accepting = False
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.deadline
+        self.accepting = False
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=max(0.0, end - loop.time()))
+        except asyncio.TimeoutError:
+            logger.error(f"❌ {self._active} write(s) still running at shutdown deadline")
+
+        for name, step in self._steps:
+            # حتى بعد انتهاء المهلة نعطي كل خطوة ثانية واحدة (مثل إغلاق الاتصالات)
+            remaining = max(1.0, end - loop.time())
+            try:
+                await asyncio.wait_for(step(remaining), timeout=remaining)
+                logger.info(f"✅ Shutdown step done: {name}")
+            except asyncio.TimeoutError:
+                logger.error(f"❌ Shutdown step timed out: {name}")
+            except Exception as e:
+                logger.error(f"❌ Shutdown step failed ({name}): {e}")
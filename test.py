@@ -28,6 +28,13 @@ def test_imports():
         print(f"  ❌ asyncpg: {e}")
         return False
     
+    try:
+        import numpy
+        print("  ✅ numpy")
+    except ImportError as e:
+        print(f"  ❌ numpy: {e}")
+        return False
+    
     try:
         from dotenv import load_dotenv
         print("  ✅ python-dotenv")
@@ -48,7 +55,7 @@ def test_syntax():
     """اختبار الـ syntax"""
     print("\n🔍 Testing syntax...")
     
-    files = ['bot.py', 'db.py', 'web.py']
+    files = ['bot.py', 'db.py', 'web.py', 'scheduler.py', 'analytics.py', 'cache.py', 'router.py', 'registry.py', 'shutdown.py', 'profiling.py', 'batching.py', 'guilds.py', 'backup.py']
     
     for file in files:
         if not os.path.exists(file):
@@ -66,6 +73,531 @@ def test_syntax():
     
     return True
 
+def _copy_binary(rows):
+    """بناء مخرجات COPY binary لأعمدة bigint (لاختبار analytics)"""
+    import struct
+    data = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+    for row in rows:
+        data += struct.pack('>h', len(row))
+        for value in row:
+            data += struct.pack('>iq', 8, value)
+    return data + struct.pack('>h', -1)
+
+def test_logic():
+    """اختبار منطق الوحدات (بدون Discord أو قاعدة بيانات)"""
+    print("\n🔍 Testing module logic...")
+    
+    # ---------- analytics ----------
+    import analytics
+    
+    us = 1_000_000
+    auctions = analytics.decode_copy(_copy_binary([
+        (1, 0, 600 * us, 100, 300, 11),
+        (2, 0, 600 * us, 100, 100, 0),
+    ]), analytics.AUCTION_COLUMNS)
+    if list(auctions['id']) != [1, 2] or list(auctions['final_price']) != [300, 100]:
+        print("  ❌ decode_copy returned wrong columns")
+        return False
+    print("  ✅ analytics.decode_copy")
+    
+    # المزايدة الأخيرة لمزاد 9 غير موجود (snapshot مختلف) ويجب أن تُستبعد
+    bids = analytics.decode_copy(_copy_binary([
+        (1, 11, 200, 100 * us),
+        (1, 12, 250, 300 * us),
+        (1, 11, 300, 590 * us),
+        (9, 12, 500, 10 * us),
+    ]), analytics.BID_COLUMNS)
+    result = analytics.compute(auctions, bids)
+    if result['bids'] != 3 or list(result['per_auction']['bids']) != [3, 0]:
+        print(f"  ❌ compute counted bids wrong: {result['per_auction']['bids']}")
+        return False
+    if result['sniping_ratio'] != 1.0 or list(result['users']['wins']) != [1, 0]:
+        print("  ❌ compute sniping/wins wrong")
+        return False
+    print("  ✅ analytics.compute")
+    
+    return True
+
+def test_cache():
+    """اختبار كاش الاستعلامات"""
+    print("\n🔍 Testing query cache...")
+    
+    import asyncio
+    from cache import QueryCache
+    
+    async def check_cache():
+        cache = QueryCache(ttl=60)
+        calls = []
+        
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+        
+        # الطلبات المتزامنة تشترك في تحميل واحد
+        values = await asyncio.gather(*(cache.get_or_load('a', [('guild', 1)], loader) for _ in range(5)))
+        assert values == [1] * 5 and len(calls) == 1, "loads not coalesced"
+        assert await cache.get_or_load('a', [('guild', 1)], loader) == 1, "cached value not returned"
+        
+        cache.invalidate(('guild', 1))
+        assert await cache.get_or_load('a', [('guild', 1)], loader) == 2, "invalidate did not drop entry"
+        
+        # invalidate لسيرفر آخر لا يمنع تخزين تحميل جارٍ
+        task = asyncio.create_task(cache.get_or_load('b', [('guild', 2)], loader))
+        await asyncio.sleep(0)
+        cache.invalidate(('guild', 3))
+        await task
+        assert 'b' in cache._entries, "unrelated invalidate dropped in-flight load"
+        
+        # invalidate لنفس السيرفر يمنع تخزين نتيجة قد تكون قديمة
+        task = asyncio.create_task(cache.get_or_load('c', [('guild', 2)], loader))
+        await asyncio.sleep(0)
+        cache.invalidate(('guild', 2))
+        await task
+        assert 'c' not in cache._entries, "stale in-flight load was stored"
+        assert cache.recently_invalidated([('guild', 2)]), "recent invalidation not tracked"
+    
+    async def check_cancelled_leader():
+        cache = QueryCache(ttl=60)
+        calls = []
+        
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+        
+        # إلغاء الطلب الذي يحمّل لا يُلغي المنتظرين، بل يحمّل أحدهم من جديد
+        leader = asyncio.create_task(cache.get_or_load('k', [], loader))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(cache.get_or_load('k', [], loader)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        values = await asyncio.gather(*followers)
+        assert values == [2, 2] and len(calls) == 2, f"followers did not retry: {values}"
+    
+    for name, check in (("coalescing and invalidation", check_cache), ("cancelled loader", check_cancelled_leader)):
+        try:
+            asyncio.run(check())
+            print(f"  ✅ {name}")
+        except AssertionError as e:
+            print(f"  ❌ {name}: {e}")
+            return False
+    
+    return True
+
+def test_registry():
+    """اختبار فهارس المزادات النشطة"""
+    print("\n🔍 Testing auction registry...")
+    
+    from types import SimpleNamespace
+    from registry import AuctionRegistry
+    
+    def auction(message_id, guild_id, channel_id, db_id):
+        return SimpleNamespace(message_id=message_id, guild_id=guild_id, channel_id=channel_id,
+                               db_id=db_id, ended=False, cancelled=False)
+    
+    registry = AuctionRegistry()
+    registry.add(auction(100, 1, 10, 1))
+    registry.add(auction(101, 1, 11, 2))
+    registry.add(auction(102, 2, 20, 3))
+    registry.get(101).ended = True
+    checks = [
+        len(registry) == 3,
+        [a.message_id for a in registry.active_in_guild(1)] == [100],
+        registry.by_db_id(3).message_id == 102,
+        registry.in_channel(11)[0].db_id == 2,
+    ]
+    registry.remove(100)
+    checks += [registry.get(100) is None, registry.by_db_id(1) is None, registry.count_in_guild(1) == 1]
+    # نفس الرسالة تستبدل المزاد القديم وتحذفه من الفهارس
+    registry.add(auction(102, 2, 20, 4))
+    checks += [registry.by_db_id(3) is None, registry.by_db_id(4).message_id == 102, len(registry) == 2]
+    if not all(checks):
+        print(f"  ❌ AuctionRegistry indexes inconsistent: {checks}")
+        return False
+    print("  ✅ AuctionRegistry")
+    
+    return True
+
+def test_scheduler():
+    """اختبار جدولة طلبات REST (الدمج والتكيف مع 429)"""
+    print("\n🔍 Testing REST scheduler...")
+    
+    import asyncio
+    from types import SimpleNamespace
+    from yarl import URL
+    from scheduler import RestScheduler, PRIORITY_FINAL, PRIORITY_COUNTDOWN
+    
+    async def check_coalescing():
+        scheduler = RestScheduler()
+        scheduler.start()
+        ran = []
+        
+        async def final():
+            ran.append('final')
+        
+        async def countdown():
+            ran.append('countdown')
+        
+        # العداد بعد لوحة الإنهاء لا يستبدلها
+        first = scheduler.submit(PRIORITY_FINAL, 1, final, key=('panel', 1))
+        second = scheduler.submit(PRIORITY_COUNTDOWN, 1, countdown, key=('panel', 1))
+        assert first is second, "same key was not coalesced"
+        await asyncio.wait_for(first, 5)
+        
+        # لوحة الإنهاء بعد العداد تحل محله
+        scheduler.submit(PRIORITY_COUNTDOWN, 2, countdown, key=('panel', 2))
+        await asyncio.wait_for(scheduler.submit(PRIORITY_FINAL, 2, final, key=('panel', 2)), 5)
+        await scheduler.stop()
+        assert ran == ['final', 'final'], f"unexpected runs: {ran}"
+    
+    async def check_rate_limit():
+        scheduler = RestScheduler()
+        trace = scheduler.trace_config()
+        hook = trace.on_request_end[0]
+        
+        def response(status, url, **headers):
+            return SimpleNamespace(url=URL(url), response=SimpleNamespace(status=status, headers=headers))
+        
+        base = scheduler._channel(123).rate
+        await hook(None, None, response(200, "https://discord.com/api/v10/channels/123/messages/1"))
+        assert scheduler._channel(123).rate == base, "non-429 changed the budget"
+        
+        await hook(None, None, response(429, "https://discord.com/api/v10/channels/123/messages/1", **{'Retry-After': '2'}))
+        assert scheduler._channel(123).rate < base, "429 did not lower the channel rate"
+        assert scheduler._channel(123).delay(asyncio.get_running_loop().time()) > 1, "channel not blocked"
+        
+        global_base = scheduler._global.rate
+        await hook(None, None, response(
+            429, "https://discord.com/api/v10/channels/456/messages",
+            **{'Retry-After': '1', 'X-RateLimit-Global': 'true'}
+        ))
+        assert scheduler._global.rate < global_base, "global 429 did not lower the global rate"
+    
+    for name, check in (("coalescing", check_coalescing), ("429 via http_trace", check_rate_limit)):
+        try:
+            asyncio.run(check())
+            print(f"  ✅ {name}")
+        except AssertionError as e:
+            print(f"  ❌ {name}: {e}")
+            return False
+    
+    return True
+
+def test_router():
+    """اختبار توجيه التفاعلات (defer تلقائي والرد عند الخطأ)"""
+    print("\n🔍 Testing interaction router...")
+    
+    import asyncio
+    from router import InteractionRouter, ERROR_MESSAGE
+    
+    class FakeResponse:
+        def __init__(self, sent):
+            self.sent = sent
+            self.done = False
+        
+        def is_done(self):
+            return self.done
+        
+        async def defer(self, **kwargs):
+            self.done = True
+            self.sent.append('defer')
+        
+        async def send_message(self, content=None, **kwargs):
+            self.done = True
+            self.sent.append(content)
+    
+    class FakeFollowup:
+        def __init__(self, sent):
+            self.sent = sent
+        
+        async def send(self, content=None, **kwargs):
+            self.sent.append(('followup', content))
+    
+    class FakeInteraction:
+        def __init__(self, custom_id, components=None):
+            self.id = id(self)
+            self.data = {'custom_id': custom_id, 'components': components or []}
+            self.sent = []
+            self.response = FakeResponse(self.sent)
+            self.followup = FakeFollowup(self.sent)
+    
+    async def check_router():
+        router = InteractionRouter(defer_after=0.01)
+        
+        @router.route("slow", int)
+        async def slow(interaction, n):
+            await asyncio.sleep(0.05)
+            await router.respond(interaction, f"done {n}")
+        
+        @router.route("fast")
+        async def fast(interaction):
+            await router.respond(interaction, "fast")
+        
+        @router.route("boom")
+        async def boom(interaction):
+            raise RuntimeError("boom")
+        
+        @router.route("modal", int)
+        async def modal(interaction, n):
+            await router.respond(interaction, router.field(interaction, "amount"))
+        
+        interaction = FakeInteraction("slow:7")
+        assert await router.dispatch(interaction), "route not found"
+        assert interaction.sent == ['defer', ('followup', "done 7")], f"slow route: {interaction.sent}"
+        
+        interaction = FakeInteraction("fast")
+        await router.dispatch(interaction)
+        assert interaction.sent == ["fast"], f"fast route was deferred: {interaction.sent}"
+        
+        interaction = FakeInteraction("boom")
+        await router.dispatch(interaction)
+        assert interaction.sent == [ERROR_MESSAGE], f"failed route not answered: {interaction.sent}"
+        assert router.stats()['boom']['errors'] == 1, "error not counted"
+        
+        interaction = FakeInteraction("modal:1", [{'components': [{'custom_id': 'amount', 'value': '500k'}]}])
+        await router.dispatch(interaction)
+        assert interaction.sent == ["500k"], f"modal field not read: {interaction.sent}"
+        
+        assert not await router.dispatch(FakeInteraction("slow:x")), "bad argument was routed"
+        assert not await router.dispatch(FakeInteraction("unknown:1")), "unknown prefix was routed"
+    
+    try:
+        asyncio.run(check_router())
+        print("  ✅ auto-defer, error reply and modal fields")
+    except AssertionError as e:
+        print(f"  ❌ router: {e}")
+        return False
+    
+    return True
+
+def test_batching():
+    """اختبار تجميع العمليات (MicroBatcher و end_auctions)"""
+    print("\n🔍 Testing micro-batching...")
+    
+    import asyncio
+    from contextlib import asynccontextmanager
+    import db
+    from batching import MicroBatcher
+    
+    async def check_batcher():
+        batches = []
+        
+        async def process(items):
+            batches.append(list(items))
+            if 'bad' in items:
+                raise RuntimeError("boom")
+        
+        batcher = MicroBatcher(process, window=0.01, max_batch=3)
+        await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        assert batches == [[0, 1, 2], [3, 4]], f"unexpected batches: {batches}"
+        
+        # فشل الدفعة لا يترك المنتظرين معلقين
+        await asyncio.wait_for(batcher.submit('bad'), 1)
+        await asyncio.sleep(0)
+        assert not batcher._tasks, "finished batch tasks were kept"
+    
+    async def check_end_auctions():
+        queries = []
+        
+        class FakeConn:
+            async def fetch(self, query, *args):
+                queries.append(args)
+                return [{'id': auction_id, 'guild_id': 9} for auction_id in args[0]]
+        
+        class FakePool:
+            @asynccontextmanager
+            async def acquire(self):
+                yield FakeConn()
+        
+        old_pool = db._pool
+        db._pool = FakePool()
+        try:
+            await db.end_auctions([(1, 10, 100), (2, None, 50)])
+            await db.end_auctions([])
+        finally:
+            db._pool = old_pool
+        assert queries == [([1, 2], [10, None], [100, 50])], f"not one batched query: {queries}"
+        assert db._cache.recently_invalidated([('auction', 2), ('guild', 9)]), "cache not invalidated"
+    
+    for name, check in (("MicroBatcher", check_batcher), ("end_auctions", check_end_auctions)):
+        try:
+            asyncio.run(check())
+            print(f"  ✅ {name}")
+        except AssertionError as e:
+            print(f"  ❌ {name}: {e}")
+            return False
+    
+    return True
+
+def test_guild_settings():
+    """اختبار إعدادات السيرفرات (تحميل مرة واحدة، المسح، LRU)"""
+    print("\n🔍 Testing guild settings...")
+    
+    import asyncio
+    import db
+    from guilds import GuildSettingsStore
+    
+    async def check_settings():
+        rows = {1: {'log_channel_id': None, 'bidder_role_id': 5, 'currency_name': "كريدت",
+                    'commission': 10, 'max_active_auctions': 4}}
+        loads = []
+        
+        async def get_guild_settings(guild_id):
+            loads.append(guild_id)
+            await asyncio.sleep(0.01)
+            return dict(rows[guild_id]) if guild_id in rows else None
+        
+        async def set_guild_settings(guild_id, values):
+            row = rows.setdefault(guild_id, {c: None for c in db.GUILD_SETTING_COLUMNS})
+            row.update(values)
+            return dict(row)
+        
+        old = db.get_guild_settings, db.set_guild_settings
+        db.get_guild_settings, db.set_guild_settings = get_guild_settings, set_guild_settings
+        try:
+            store = GuildSettingsStore(max_cached=2, fallback={'log_channel_id': 99})
+            first = await asyncio.gather(*(store.get(1) for _ in range(3)))
+            assert loads == [1], f"settings loaded more than once: {loads}"
+            assert first[0]['log_channel_id'] == 99 and first[0]['max_active_auctions'] == 4, "fallback not merged"
+            assert (await store.get(2))['max_active_auctions'] is None, "default is not unlimited"
+            
+            # None يمسح الإعداد فيرجع للافتراضي
+            cleared = await store.update(1, bidder_role_id=None, max_active_auctions=None)
+            assert rows[1]['bidder_role_id'] is None, "NULL was not written"
+            assert cleared['bidder_role_id'] is None and cleared['max_active_auctions'] is None, "setting not cleared"
+            assert cleared['currency_name'] == "كريدت", "untouched setting changed"
+            
+            await store.get(3)
+            assert len(store) == 2 and 2 not in store._cache, "LRU did not evict"
+        finally:
+            db.get_guild_settings, db.set_guild_settings = old
+    
+    try:
+        asyncio.run(check_settings())
+        print("  ✅ lazy load, reset and LRU")
+    except AssertionError as e:
+        print(f"  ❌ guild settings: {e}")
+        return False
+    
+    return True
+
+def test_shutdown():
+    """اختبار الإيقاف الآمن (انتظار الكتابات ورفض الجديدة)"""
+    print("\n🔍 Testing shutdown coordinator...")
+    
+    import asyncio
+    from shutdown import ShutdownCoordinator, ShutdownInProgress
+    
+    async def check_shutdown():
+        shutdown = ShutdownCoordinator(deadline=1.0)
+        events = []
+        
+        async def step(remaining):
+            events.append('step')
+        
+        shutdown.add_step("close", step)
+        
+        async def write():
+            async with shutdown.guard():
+                await asyncio.sleep(0.05)
+                events.append('write')
+        
+        writer = asyncio.create_task(write())
+        await asyncio.sleep(0)
+        task = shutdown.trigger("test")
+        assert shutdown.closing, "shutdown did not stop accepting"
+        
+        try:
+            async with shutdown.guard():
+                events.append('late write')
+        except ShutdownInProgress:
+            events.append('refused')
+        
+        await asyncio.wait_for(task, 2)
+        await writer
+        assert events == ['refused', 'write', 'step'], f"unexpected order: {events}"
+        assert shutdown.trigger("again") is task, "second trigger started another shutdown"
+    
+    try:
+        asyncio.run(check_shutdown())
+        print("  ✅ drain, refusal and steps")
+    except AssertionError as e:
+        print(f"  ❌ shutdown: {e}")
+        return False
+    
+    return True
+
+def test_backup():
+    """اختبار صيغة ملف النسخة الاحتياطية (dump ثم load)"""
+    print("\n🔍 Testing backup format...")
+    
+    import asyncio
+    import os
+    import tempfile
+    from contextlib import asynccontextmanager
+    import backup
+    
+    tables = {name: [f"{name}-{i}-".encode() * 5 for i in range(4)] for name in backup.TABLES}
+    
+    class FakeConn:
+        def __init__(self):
+            self.restored = {}
+            self.queries = []
+        
+        @asynccontextmanager
+        async def transaction(self, **kwargs):
+            yield
+        
+        async def copy_from_table(self, name, columns, output, format, timeout):
+            for chunk in tables[name]:
+                await output(chunk)
+            return f"COPY {len(tables[name])}"
+        
+        async def copy_to_table(self, name, source, columns, format, timeout):
+            self.restored[name] = b"".join([frame async for frame in source])
+        
+        async def execute(self, query, *args, timeout=None):
+            self.queries.append(query)
+            return "INSERT 0 3"
+    
+    async def check_round_trip(path):
+        old_frame = backup.FRAME_SIZE
+        backup.FRAME_SIZE = 64   # عدة إطارات لكل جدول
+        try:
+            counts = await backup.dump(FakeConn(), path)
+            assert counts == {name: 4 for name in backup.TABLES}, f"wrong dump counts: {counts}"
+            conn = FakeConn()
+            counts = await backup.load(conn, path, channel_ids=[1])
+        finally:
+            backup.FRAME_SIZE = old_frame
+        for name in backup.TABLES:
+            assert conn.restored[f"_restore_{name}"] == b"".join(tables[name]), f"{name} data changed"
+        assert counts == {name: 3 for name in backup.TABLES}, f"wrong restore counts: {counts}"
+        
+        # ملف مقطوع يُرفض بدل استعادة جزء منه
+        with backup._open(path, 'rb') as f:
+            data = f.read()
+        with backup._open(path, 'wb') as f:
+            f.write(data[:-10])
+        try:
+            await backup.load(FakeConn(), path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("truncated backup was accepted")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for filename in ("auctions.bak", "auctions.bak.gz"):
+            try:
+                asyncio.run(check_round_trip(os.path.join(tmp, filename)))
+                print(f"  ✅ {filename} round-trip")
+            except AssertionError as e:
+                print(f"  ❌ {filename}: {e}")
+                return False
+    
+    return True
+
 def test_environment():
     """اختبار متغيرات البيئة"""
     print("\n🔍 Testing environment...")
@@ -102,8 +634,11 @@ def test_database():
         # التحقق من وجود الدوال المطلوبة
         functions = [
             'init_pool', 'create_tables', 'insert_auction',
-            'end_auction', 'cancel_auction', 'insert_bid',
-            'get_bids_for_auction', 'get_auction_history'
+            'end_auction', 'end_auctions', 'cancel_auction', 'insert_bid',
+            'get_guild_settings', 'set_guild_settings',
+            'backup_to_file', 'restore_from_file',
+            'get_bids_for_auction', 'get_auction_history',
+            'copy_guild_history_binary', 'get_live_auctions'
         ]
         
         for func in functions:
@@ -145,6 +680,16 @@ def test_files():
         'bot.py',
         'db.py',
         'web.py',
+        'scheduler.py',
+        'analytics.py',
+        'cache.py',
+        'router.py',
+        'registry.py',
+        'shutdown.py',
+        'profiling.py',
+        'batching.py',
+        'guilds.py',
+        'backup.py',
         'requirements.txt',
         'Procfile',
         'runtime.txt',
@@ -175,6 +720,15 @@ def main():
         ("Syntax", test_syntax),
         ("Imports", test_imports),
         ("Database Module", test_database),
+        ("Module Logic", test_logic),
+        ("Auction Registry", test_registry),
+        ("REST Scheduler", test_scheduler),
+        ("Query Cache", test_cache),
+        ("Interaction Router", test_router),
+        ("Shutdown", test_shutdown),
+        ("Micro-Batching", test_batching),
+        ("Guild Settings", test_guild_settings),
+        ("Backup Format", test_backup),
         ("Web Server", test_web),
         ("Environment", test_environment),
     ]